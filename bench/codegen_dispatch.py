@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+"""
+Microbenchmark: per-node cost of generate_expr with the type-keyed dispatch
+table against the isinstance chain it replaced.
+
+    python bench/codegen_dispatch.py [--nodes N] [--repeat R]
+
+Builds a large random expression AST, then times both versions over it and
+over single-kind batches (children are Var leaves, whose cost is included).
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import codegen  # noqa: E402
+from nodes import *  # noqa: E402
+
+
+def isinstance_chain(expr: object | None) -> str:
+    """generate_expr as it was before the dispatch table (the baseline)."""
+    if expr is None:
+        return ""
+
+    if isinstance(expr, Num):
+        return str(expr.value)
+    elif isinstance(expr, Str):
+        return f'"{expr.value}"'
+    elif isinstance(expr, Bool):
+        return "true" if expr.value else "false"
+    elif isinstance(expr, Var):
+        return expr.name
+    elif isinstance(expr, MemberAccess):
+        return f"{isinstance_chain(expr.obj)}.{expr.member}"
+    elif isinstance(expr, AttributeAccess):
+        return f"{isinstance_chain(expr.obj)}->{expr.attribute}"
+    elif isinstance(expr, IndexAccess):
+        return f"{isinstance_chain(expr.obj)}[{isinstance_chain(expr.index)}]"
+    elif isinstance(expr, UnaryOp):
+        return f"{expr.op}{isinstance_chain(expr.operand)}"
+    elif isinstance(expr, BinOp):
+        left = isinstance_chain(expr.left)
+        right = isinstance_chain(expr.right)
+        return f"({left} {expr.op} {right})"
+    elif isinstance(expr, FuncCall):
+        args = ", ".join(isinstance_chain(arg) for arg in expr.args)
+        return f"{expr.func_name}({args})"
+    elif isinstance(expr, StructLiteral):
+        init_parts = []
+        for key, val in expr.fields:
+            val_str = isinstance_chain(val)
+            part = f".{key} = {val_str}" if key is not None else val_str
+            init_parts.append(part)
+        return "{" + ", ".join(init_parts) + "}"
+    elif isinstance(expr, (PCast, Cast)):
+        is_ptr = isinstance(expr, PCast)
+        cast_type = codegen.convert_type(expr.type_name) + ("*" if is_ptr else "")
+        return f"({cast_type}) {isinstance_chain(expr.expr)}"
+    elif isinstance(expr, Char):
+        return f"{expr.value}"
+    elif isinstance(expr, PreprocessorDirective):
+        return expr.directive
+    elif isinstance(expr, Deref):
+        return f"*{expr.expr}"
+    else:
+        raise Exception(f"Unknown expression type: {expr}")
+
+
+def leaf() -> object:
+    return Var("x")
+
+
+# one constructor per expression node kind
+KINDS = {
+    "Num": lambda sub: Num("1"),
+    "Str": lambda sub: Str("s"),
+    "Bool": lambda sub: Bool(True),
+    "Var": lambda sub: Var("v"),
+    "MemberAccess": lambda sub: MemberAccess(sub(), "m"),
+    "AttributeAccess": lambda sub: AttributeAccess(sub(), "a"),
+    "IndexAccess": lambda sub: IndexAccess(sub(), sub()),
+    "UnaryOp": lambda sub: UnaryOp("!", sub()),
+    "BinOp": lambda sub: BinOp(sub(), "+", sub()),
+    "FuncCall": lambda sub: FuncCall("f", [sub(), sub()]),
+    "StructLiteral": lambda sub: StructLiteral([("a", sub()), (None, sub())]),
+    "Cast": lambda sub: Cast("int", sub()),
+    "Char": lambda sub: Char("'c'"),
+    "PreprocessorDirective": lambda sub: PreprocessorDirective("__LINE__"),
+    "Deref": lambda sub: Deref("p"),
+}
+
+
+def count(expr) -> int:
+    if not hasattr(expr, "__dataclass_fields__"):
+        return 0
+    total = 1
+    for name in expr.__dataclass_fields__:
+        value = getattr(expr, name)
+        children = value if isinstance(value, list) else [value]
+        for child in children:
+            if isinstance(child, tuple):
+                child = child[1]
+            total += count(child)
+    return total
+
+
+def random_tree(rng: random.Random, depth: int) -> object:
+    if depth == 0:
+        return leaf()
+    make = KINDS[rng.choice(list(KINDS))]
+    return make(lambda: random_tree(rng, depth - 1))
+
+
+def best(fn, exprs: list, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for expr in exprs:
+            fn(expr)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    forest, nodes = [], 0
+    while nodes < args.nodes:
+        tree = random_tree(rng, 6)
+        forest.append(tree)
+        nodes += count(tree)
+
+    for expr in forest:
+        assert isinstance_chain(expr) == codegen.generate_expr(expr)
+
+    before = best(isinstance_chain, forest, args.repeat)
+    after = best(codegen.generate_expr, forest, args.repeat)
+    print(f"mixed AST, {nodes} nodes")
+    print(f"  isinstance chain  {before / nodes * 1e9:7.1f} ns/node")
+    print(f"  dispatch table    {after / nodes * 1e9:7.1f} ns/node")
+    print()
+    print(f"{'node':<24}{'chain ns':>10}{'table ns':>10}{'speedup':>9}")
+    batch = max(1, args.nodes // 20)
+    for name, make in KINDS.items():
+        exprs = [make(leaf) for _ in range(batch)]
+        n = sum(map(count, exprs))
+        chain = best(isinstance_chain, exprs, args.repeat) / n * 1e9
+        table = best(codegen.generate_expr, exprs, args.repeat) / n * 1e9
+        print(f"{name:<24}{chain:>10.1f}{table:>10.1f}{chain / table:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+"""
+Synthetic Neon programs for benchmarking the compiler.
+
+    python bench/corpus.py OUTDIR [--shape NAME] [--scale S]
+
+Each shape stresses one part of the front end: many functions, deeply
+nested blocks, long expressions, big type/enum declarations, and a wide
+import fan-out in the style of .neon/raylib.neon. --scale multiplies how
+many of each thing is generated (not their depth, which is bounded by
+Python's recursion limit). Programs only use builtin types, so the C they
+turn into compiles without any headers. "main.neon" is always the entry.
+"""
+
+import argparse
+import os
+import random
+
+ENTRY = "main.neon"
+OPERATORS = ["+", "-", "*", "/", "%", "&", "|", "<", "==", "&&", "||"]
+DIVISORS = ["7", "255", "(a | 1)"]
+
+
+def _scaled(count: int, scale: float) -> int:
+    return max(1, round(count * scale))
+
+
+def _expression(rng: random.Random, operands: list[str], length: int) -> str:
+    parts = [rng.choice(operands)]
+    for _ in range(length - 1):
+        op = rng.choice(OPERATORS)
+        if op in ("/", "%"):
+            operand = rng.choice(DIVISORS)  # so cc has nothing to warn about
+        elif rng.random() < 0.2:
+            operand = f"({rng.choice(operands)} + {rng.choice(operands)})"
+        else:
+            operand = rng.choice(operands)
+        parts.append(f"{op} {operand}")
+    return " ".join(parts)
+
+
+def _main(calls: list[str]) -> str:
+    lines = ["func main() -> int", "{", "\tvar total int = 0"]
+    lines += [f"\ttotal = total + {call}" for call in calls]
+    lines += ["\treturn total % 256", "}"]
+    return "\n".join(lines)
+
+
+def functions(scale: float = 1.0, count: int = 2000) -> dict[str, str]:
+    """Many small functions with a bit of everything, each calling the last."""
+    count = _scaled(count, scale)
+    out = []
+    for n in range(count):
+        call = f"f{n - 1}(b, t)" if n else "a"
+        out.append(
+            f"""func f{n}(a int, b int) -> int
+{{
+\tvar t int = a * {n % 7 + 1} + b
+\tif t > {n % 100} {{
+\t\tt = t - b
+\t}} else {{
+\t\tt = t + {call}
+\t}}
+\tfor var i int = 0; i < 4; i += 1 {{
+\t\tt = t + i
+\t}}
+\twhile t > 1000 {{
+\t\tt = t / 2
+\t}}
+\treturn t
+}}"""
+        )
+    out.append(_main([f"f{count - 1}(1, 2)"]))
+    return {ENTRY: "\n".join(out) + "\n"}
+
+
+def nesting(scale: float = 1.0, count: int = 60, depth: int = 40) -> dict[str, str]:
+    """Functions whose bodies are if/while/for blocks nested depth deep."""
+    count = _scaled(count, scale)
+    out = []
+    for n in range(count):
+        lines = [f"func nest{n}(a int) -> int", "{", "\tvar x int = a"]
+        for level in range(depth):
+            tabs = "\t" * (level + 1)
+            kind = level % 3
+            if kind == 0:
+                lines.append(f"{tabs}if x > {level} {{")
+            elif kind == 1:
+                lines.append(f"{tabs}while x < {level * 10} {{")
+            else:
+                lines.append(f"{tabs}for var i{level} int = 0; i{level} < 2; i{level} += 1 {{")
+            lines.append(f"{tabs}\tx = x + {level}")
+        for level in reversed(range(depth)):
+            lines.append("\t" * (level + 1) + "}")
+        lines += ["\treturn x", "}"]
+        out.append("\n".join(lines))
+    out.append(_main([f"nest{n}({n})" for n in range(count)]))
+    return {ENTRY: "\n\n".join(out) + "\n"}
+
+
+def expressions(
+    scale: float = 1.0, count: int = 400, length: int = 200
+) -> dict[str, str]:
+    """Functions made of var initialisers that are length operands long."""
+    rng = random.Random(0)
+    count = _scaled(count, scale)
+    operands = ["a", "b", "c", "1", "7", "255", "-3", "(a + 1)", "!b", "-c"]
+    out = []
+    for n in range(0, count, 10):
+        lines = [f"func expr{n}(a int, b int, c int) -> int", "{"]
+        for k in range(min(10, count - n)):
+            lines.append(f"\tvar v{k} int = {_expression(rng, operands, length)}")
+        lines += ["\treturn v0", "}"]
+        out.append("\n".join(lines))
+    out.append(_main([f"expr{n}(1, 2, 3)" for n in range(0, count, 10)]))
+    return {ENTRY: "\n\n".join(out) + "\n"}
+
+
+def declarations(
+    scale: float = 1.0, count: int = 40, fields: int = 200, members: int = 500
+) -> dict[str, str]:
+    """Big struct types and enums, and a function touching each of them."""
+    count = _scaled(count, scale)
+    types = ["int", "float", "double", "uint", "char", "uchar", "ulong"]
+    out = []
+    for n in range(count):
+        body = "\n".join(
+            f"\tfield{k} {types[k % len(types)]}" + (";" if k % 2 else "")
+            for k in range(fields)
+        )
+        out.append(f"type Big{n} = {{\n{body}\n}}")
+        names = "\n".join(
+            f"\tE{n}_MEMBER{k} = {k}" if k % 5 == 0 else f"\tE{n}_MEMBER{k}"
+            for k in range(members)
+        )
+        out.append(f"enum Kind{n} = {{\n{names}\n}}")
+        out.append(
+            f"""func touch{n}() -> int
+{{
+\tvar value Big{n}
+\tvalue.field0 = E{n}_MEMBER{members - 1}
+\treturn value.field0
+}}"""
+        )
+    out.append(_main([f"touch{n}()" for n in range(count)]))
+    return {ENTRY: "\n\n".join(out) + "\n"}
+
+
+def imports(scale: float = 1.0, modules: int = 64) -> dict[str, str]:
+    """main imports many modules; each declares types, enums and functions
+    and imports a shared one, like a program built on raylib.neon."""
+    modules = _scaled(modules, scale)
+    files = {
+        "common.neon": """type Vec2 = {
+\tx float; y float
+}
+
+enum Side = {
+\tSIDE_LEFT = 0
+\tSIDE_RIGHT
+}
+
+func clamp(v int, lo int, hi int) -> int
+{
+\tif v < lo {
+\t\treturn lo
+\t}
+\tif v > hi {
+\t\treturn hi
+\t}
+\treturn v
+}
+"""
+    }
+    for n in range(modules):
+        items = ['import "common"']
+        for k in range(8):
+            items.append(
+                f"type Mod{n}Rect{k} = {{\n\tx float; y float;\n\twidth float; height float\n}}"
+            )
+        items.append(
+            f"enum Mod{n}Key = {{\n"
+            + "\n".join(f"\tMOD{n}_KEY{k} = {k}" for k in range(32))
+            + "\n}"
+        )
+        for k in range(16):
+            items.append(
+                f"""func mod{n}_fn{k}(a int, b int) -> int
+{{
+\tvar v Vec2
+\tv.x = a
+\treturn clamp(a * {k + 1} + b, 0, MOD{n}_KEY{k})
+}}"""
+            )
+        files[f"mod{n}.neon"] = "\n\n".join(items) + "\n"
+    entry = [f'import "mod{n}"' for n in range(modules)]
+    entry.append(_main([f"mod{n}_fn0({n}, 1)" for n in range(modules)]))
+    files[ENTRY] = "\n".join(entry) + "\n"
+    return files
+
+
+SHAPES = {
+    "functions": functions,
+    "nesting": nesting,
+    "expressions": expressions,
+    "declarations": declarations,
+    "imports": imports,
+}
+
+
+def write(files: dict[str, str], directory: str) -> str:
+    """Write a generated program into directory; returns the entry's path."""
+    os.makedirs(directory, exist_ok=True)
+    for name, text in files.items():
+        with open(os.path.join(directory, name), "w") as f:
+            f.write(text)
+    return os.path.join(directory, ENTRY)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("directory")
+    parser.add_argument("--shape", choices=SHAPES, default="functions")
+    parser.add_argument("--scale", type=float, default=1.0)
+    args = parser.parse_args()
+
+    files = SHAPES[args.shape](args.scale)
+    entry = write(files, args.directory)
+    lines = sum(text.count("\n") for text in files.values())
+    print(f"{entry}: {len(files)} files, {lines} lines")
+
+
+if __name__ == "__main__":
+    main()
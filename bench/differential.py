@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+"""
+Differential checks for the parts of the compiler that have a reference
+to be checked against.
+
+    python bench/differential.py [--seed N] [--cases N] [--cc CC]
+                                 [--skip-fold] [--skip-tokens]
+
+fold: random constant expressions (int, double and boolean literals,
+arithmetic, comparisons, logic and casts) go through the -O optimizer.
+Every one it folds to a literal is compiled both ways into one C program,
+and cc's value and type for the original have to be the folded literal's.
+
+tokens: tokenize_regex has to give tokenize_legacy's output, token for
+token (or raise the same error), on every .neon file in the repo, on each
+corpus.py shape and on random strings made of the pieces tokens are made
+of, including the ones only the legacy scanner takes.
+
+Prints the first few mismatches of each check; any makes the exit status
+non-zero.
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import codegen  # noqa: E402
+import corpus  # noqa: E402
+import neon  # noqa: E402, sets tokenizer.KEYWORDS
+import optimize  # noqa: E402
+from nodes import *  # noqa: E402
+from tokenizer import tokenize_legacy, tokenize_regex  # noqa: E402
+
+INTS = [0, 1, 2, 3, 7, 10, 255, 46341, 65536, 2**31 - 1, 2**31 - 2, 2**30]
+FLOATS = [0.0, 0.5, 1.5, 2.0, 0.1, 3.25, 1e-300, 1e300, 1.7976931348623157e308]
+ARITHMETIC = ["+", "-", "*", "/"]
+BINARY = [*ARITHMETIC, "&&", "||", *optimize.COMPARISONS]
+# operators C only has for ints
+INT_ONLY = [*BINARY, "%", "&", "|"]
+CASTS = ["int", "double", "float"]
+# cc's type for an expression, as a name
+C_TYPE = (
+    "_Generic((%s), _Bool: \"bool\", int: \"int\", unsigned int: \"uint\","
+    " long: \"long\", unsigned long: \"ulong\", float: \"float\","
+    " double: \"double\", default: \"other\")"
+)
+SHOWN = 5
+
+PIECES = [
+    "a", "x1", "_b", "func", "var", " ", "\t", "\n", "@inline", "#define x", "//c",
+    "/*", "*/", "/", "...", ".", "'", '"', "\\", "-", ">", "0x1F", "0x", "12",
+    "3.5", "=", "==", "!", "<", "&", "|", "(", ")", "{", "}", ":", ";", "[", "]",
+    "+", "*", "%", ",", "é", "²", "½", "٣", "\r", "$", "-0x", "->",
+]
+
+
+def expression(rng: random.Random, depth: int) -> tuple[object, bool]:
+    """
+    A random constant expression, as the parser would build it, that C
+    accepts, and whether it is a double (or float) rather than an int.
+    """
+    roll = rng.random()
+    if depth == 0 or roll < 0.25:
+        leaf = rng.random()
+        if leaf < 0.6:
+            return Num(rng.choice(INTS)), False
+        if leaf < 0.9:
+            return Num(rng.choice(FLOATS)), True
+        return Bool(rng.random() < 0.5), False
+    if roll < 0.85:
+        (left, a), (right, b) = expression(rng, depth - 1), expression(rng, depth - 1)
+        if roll < 0.7:
+            op = rng.choice(INT_ONLY if not (a or b) else BINARY)
+            return BinOp(left, op, right), (a or b) and op in ARITHMETIC
+        if rng.random() < 0.5:
+            return UnaryOp("!", left), False
+        return UnaryOp("-", left), a
+    operand, _ = expression(rng, depth - 1)
+    type_name = rng.choice(CASTS)
+    return Cast(type_name, operand), type_name != "int"
+
+
+def folded_cases(seed: int, count: int) -> list[tuple[object, Num]]:
+    """count expressions the optimizer folds to a literal, with the literal."""
+    rng = random.Random(seed)
+    cases = []
+    while len(cases) < count:
+        expr, _ = expression(rng, rng.randint(1, 4))
+        folded = optimize.Optimizer(1).expr(expr)
+        if type(folded) is Num:
+            cases.append((expr, folded))
+    return cases
+
+
+def check_fold(seed: int, count: int, cc: str) -> int:
+    cases = folded_cases(seed, count)
+    lines = ["#include <stdbool.h>", "#include <stdio.h>", "int main(void) {"]
+    for case in cases:
+        for node in case:  # the expression, then what it folded to
+            c = codegen.generate_expr(node)
+            # the value as a double is exact for every int type here
+            lines.append(f'    printf("%a %s\\n", (double) ({c}), {C_TYPE % c});')
+    lines += ["    return 0;", "}"]
+
+    with tempfile.TemporaryDirectory() as work:
+        source = os.path.join(work, "fold.c")
+        exe = os.path.join(work, "fold")
+        with open(source, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        # -O0 and no -ffast-math: cc has to compute exactly what C says
+        subprocess.run([cc, "-O0", "-w", "-o", exe, source], check=True)
+        output = subprocess.run([exe], check=True, capture_output=True, text=True)
+    results = output.stdout.splitlines()
+
+    bad = 0
+    for i, (expr, folded) in enumerate(cases):
+        want, got = results[2 * i], results[2 * i + 1]
+        if want != got:
+            bad += 1
+            if bad <= SHOWN:
+                print(f"fold: {codegen.generate_expr(expr)}")
+                print(f"  cc:     {want}")
+                print(f"  folded: {codegen.generate_expr(folded)} = {got}")
+    print(f"fold: {len(cases)} expressions, {bad} mismatches")
+    return bad
+
+
+def tokens(tokenize, source: str) -> tuple:
+    try:
+        return ("ok", [(t.type, t.value, t.line, t.column) for t in tokenize(source, "<diff>")])
+    except Exception as error:
+        return ("error", type(error).__name__, str(error))
+
+
+def sources(seed: int, count: int):
+    """(name, source) of everything the tokenizers are compared on."""
+    for directory, dirs, files in os.walk(ROOT):
+        dirs[:] = [d for d in dirs if d != ".git"]
+        for name in sorted(files):
+            if name.endswith(".neon"):
+                path = os.path.join(directory, name)
+                with open(path) as f:
+                    yield os.path.relpath(path, ROOT), f.read()
+    for shape, generate in corpus.SHAPES.items():
+        for name, text in generate(0.02).items():
+            yield f"{shape}/{name}", text
+    rng = random.Random(seed)
+    for i in range(count):
+        pieces = rng.choices(PIECES, k=rng.randint(0, 14))
+        yield f"random #{i}", "".join(pieces)
+
+
+def check_tokens(seed: int, count: int) -> int:
+    checked = bad = 0
+    for name, source in sources(seed, count):
+        checked += 1
+        legacy, regex = tokens(tokenize_legacy, source), tokens(tokenize_regex, source)
+        if legacy != regex:
+            bad += 1
+            if bad <= SHOWN:
+                print(f"tokens: {name}: {source[:60]!r}")
+                print(f"  legacy: {str(legacy)[:200]}")
+                print(f"  regex:  {str(regex)[:200]}")
+    print(f"tokens: {checked} sources, {bad} mismatches")
+    return bad
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cases", type=int, default=2000)
+    parser.add_argument("--cc", default=os.environ.get("CC", "cc"))
+    parser.add_argument("--skip-fold", action="store_true")
+    parser.add_argument("--skip-tokens", action="store_true")
+    args = parser.parse_args()
+
+    bad = 0
+    if not args.skip_fold:
+        bad += check_fold(args.seed, args.cases, args.cc)
+    if not args.skip_tokens:
+        bad += check_tokens(args.seed, args.cases * 50)
+    if bad:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+"""
+Compiler throughput benchmarks over the synthetic programs in corpus.py.
+
+    python bench/suite.py [-o results.json] [--compare baseline.json]
+                          [--shape NAME ...] [--scale S] [--repeat R] [--no-cc]
+
+Every stage is timed on its own: tokenize (every file of the program),
+Parser.parse (imports included, but not the time spent tokenizing them),
+generate_c and the cc step (compiling the generated C to an object file).
+The parse cache is off, so every run does the full work. Each stage keeps
+the best of --repeat runs.
+
+Startup is measured too: `python -X importtime neon2c dump tokens` on a
+one-line program, counting the imports the interpreter doesn't do by
+itself. It has to stay under --startup-target milliseconds.
+
+Results are written as JSON; --compare reads an earlier run. Either check
+failing (a stage slower than --threshold, or startup over its target)
+makes the exit status non-zero.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cache  # noqa: E402
+import codegen  # noqa: E402
+import corpus  # noqa: E402
+import neon  # noqa: E402
+from tokenizer import TokenStore  # noqa: E402
+
+STAGES = ("tokenize", "parse", "generate", "cc")
+STARTUP_PROGRAM = "func main() -> int\n{\n\treturn 0\n}\n"
+
+
+class TimedTokenStore(TokenStore):
+    """TokenStore that adds up how long it spends in from_file."""
+
+    elapsed = 0.0
+
+    @classmethod
+    def from_file(cls, path: str) -> TokenStore:
+        start = time.perf_counter()
+        try:
+            return TokenStore.from_file(path)
+        finally:
+            TimedTokenStore.elapsed += time.perf_counter() - start
+
+
+def run_once(directory: str, files: list[str], cc: str | None) -> dict[str, float]:
+    times = {}
+    start = time.perf_counter()
+    for name in files:
+        TokenStore.from_file(name)
+    times["tokenize"] = time.perf_counter() - start
+
+    neon.reset()
+    tokens = TokenStore.from_file(corpus.ENTRY)
+    parser = neon.Parser(tokens, None, directory, corpus.ENTRY)
+    TimedTokenStore.elapsed = 0.0
+    neon.TokenStore = TimedTokenStore  # imports are tokenized through this
+    try:
+        start = time.perf_counter()
+        ast = parser.parse()
+        times["parse"] = time.perf_counter() - start - TimedTokenStore.elapsed
+    finally:
+        neon.TokenStore = TokenStore
+
+    codegen.keep_generated([])
+    start = time.perf_counter()
+    text = codegen.generate_c(ast)
+    times["generate"] = time.perf_counter() - start
+
+    if cc is not None:
+        with open("main.c", "w") as f:
+            f.write(text)
+        start = time.perf_counter()
+        subprocess.run([cc, "-w", "-c", "main.c", "-o", "main.o"], check=True)
+        times["cc"] = time.perf_counter() - start
+    return times
+
+
+def bench_shape(shape: str, scale: float, repeat: int, cc: str | None) -> dict:
+    files = corpus.SHAPES[shape](scale)
+    with tempfile.TemporaryDirectory(prefix=f"neon-bench-{shape}-") as directory:
+        corpus.write(files, directory)
+        cwd = os.getcwd()
+        os.chdir(directory)  # imports resolve against "./"
+        try:
+            runs = [run_once(directory, list(files), cc) for _ in range(repeat)]
+        finally:
+            os.chdir(cwd)
+    return {
+        "files": len(files),
+        "lines": sum(text.count("\n") for text in files.values()),
+        "bytes": sum(len(text) for text in files.values()),
+        "stages": {
+            stage: min(run[stage] for run in runs) for stage in STAGES if stage in runs[0]
+        },
+    }
+
+
+def _import_times(
+    args: list[str], cwd: str
+) -> tuple[float, dict[str, float], dict[str, float]]:
+    """
+    Wall time of `python -X importtime args`, the cumulative time of each
+    top-level import and the self time of every module it loaded (all ms).
+    """
+    env = {k: v for k, v in os.environ.items() if k != "NEON_DAEMON"}
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    wall = (time.perf_counter() - start) * 1000
+    modules, own = {}, {}
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | name", nested names indented
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # the header
+        own[name.strip()] = int(self_us.split(":")[1]) / 1000
+        if name.startswith(" ") and not name.startswith("  "):
+            modules[name.strip()] = int(cumulative) / 1000
+    return wall, modules, own
+
+
+def bench_startup(repeat: int, target: float) -> dict:
+    with tempfile.TemporaryDirectory(prefix="neon-bench-startup-") as directory:
+        with open(os.path.join(directory, corpus.ENTRY), "w") as f:
+            f.write(STARTUP_PROGRAM)
+        command = [os.path.join(ROOT, "neon2c"), "dump", "tokens", corpus.ENTRY]
+        bare = [_import_times(["-c", "pass"], directory) for _ in range(repeat)]
+        runs = [_import_times(command, directory) for _ in range(repeat)]
+
+    interpreter = set().union(*(run[2] for run in bare))
+    _, modules, own = min(
+        runs,
+        key=lambda run: sum(ms for name, ms in run[1].items() if name not in interpreter),
+    )
+    own = {name: ms for name, ms in own.items() if name not in interpreter}
+    return {
+        "command": "neon2c dump tokens",
+        "imports_ms": sum(ms for name, ms in modules.items() if name not in interpreter),
+        "wall_ms": min(run[0] for run in runs),
+        "interpreter_ms": min(run[0] for run in bare),
+        "target_ms": target,
+        "slowest": dict(sorted(own.items(), key=lambda kv: -kv[1])[:8]),
+    }
+
+
+def cc_version(cc: str) -> str:
+    try:
+        out = subprocess.run([cc, "--version"], capture_output=True, text=True).stdout
+    except OSError:
+        return "unknown"
+    return out.splitlines()[0] if out else "unknown"
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> bool:
+    """Print current against baseline per stage; True if anything regressed."""
+    regressed = False
+    print(f"\n{'shape':<14}{'stage':<10}{'baseline':>10}{'current':>10}{'change':>9}")
+    old_startup = baseline.get("startup")
+    if old_startup and "startup" in results:
+        old, seconds = old_startup["imports_ms"], results["startup"]["imports_ms"]
+        change = seconds / old - 1
+        mark = "  REGRESSION" if change > threshold else ""
+        regressed |= bool(mark)
+        print(f"{'startup':<14}{'imports':<10}{old:>8.1f}ms{seconds:>8.1f}ms{change:>+8.1%}{mark}")
+    for shape, case in results["shapes"].items():
+        old_case = baseline["shapes"].get(shape)
+        if old_case is None:
+            continue
+        if old_case["lines"] != case["lines"]:
+            print(f"{shape:<14}(different corpus: {old_case['lines']} vs {case['lines']} lines)")
+            continue
+        for stage, seconds in case["stages"].items():
+            old = old_case["stages"].get(stage)
+            if not old:
+                continue
+            change = seconds / old - 1
+            mark = "  REGRESSION" if change > threshold else ""
+            regressed |= bool(mark)
+            print(
+                f"{shape:<14}{stage:<10}{old * 1000:>8.1f}ms{seconds * 1000:>8.1f}ms"
+                f"{change:>+8.1%}{mark}"
+            )
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-o", "--output", help="Write the results here as JSON")
+    parser.add_argument("--compare", metavar="BASELINE", help="Results of an earlier run")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="Slowdown (as a fraction) that counts as a regression",
+    )
+    parser.add_argument("--shape", action="append", choices=corpus.SHAPES)
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cc", default=os.environ.get("CC", "cc"))
+    parser.add_argument("--no-cc", action="store_true", help="Skip the cc stage")
+    parser.add_argument(
+        "--startup-target",
+        type=float,
+        default=100.0,
+        metavar="MS",
+        help="Most milliseconds neon2c may spend importing (default: 100)",
+    )
+    args = parser.parse_args()
+
+    cache.ENABLED = False
+    cc = None if args.no_cc else args.cc
+    results = {
+        "meta": {
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "compiler_version": cache.compiler_version(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cc": cc_version(cc) if cc else None,
+            "scale": args.scale,
+            "repeat": args.repeat,
+        },
+        "shapes": {},
+    }
+
+    startup = bench_startup(max(args.repeat, 5), args.startup_target)
+    results["startup"] = startup
+    print(
+        f"startup: {startup['imports_ms']:.1f}ms of imports "
+        f"(target {args.startup_target:.0f}ms), {startup['wall_ms']:.0f}ms wall, "
+        f"{startup['interpreter_ms']:.0f}ms of it the bare interpreter"
+    )
+    print("  slowest: " + ", ".join(f"{n} {ms:.1f}ms" for n, ms in startup["slowest"].items()))
+    print()
+
+    print(f"{'shape':<14}{'lines':>8}" + "".join(f"{stage:>11}" for stage in STAGES))
+    for shape in args.shape or corpus.SHAPES:
+        case = bench_shape(shape, args.scale, args.repeat, cc)
+        results["shapes"][shape] = case
+        print(
+            f"{shape:<14}{case['lines']:>8}"
+            + "".join(
+                f"{case['stages'][stage] * 1000:>9.1f}ms" if stage in case["stages"] else f"{'-':>11}"
+                for stage in STAGES
+            )
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+
+    failed = startup["imports_ms"] > args.startup_target
+    if failed:
+        print(f"\nstartup imports take longer than the {args.startup_target:.0f}ms target")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        failed |= compare(results, baseline, args.threshold)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+On-disk caches for the Neon toolchain.
+
+Everything lives under ~/.neon/cache (or $NEON_CACHE_DIR). Keys are content
+hashes, and every key includes compiler_version(), so editing the compiler
+invalidates old entries instead of reusing them. NEON_NO_CACHE=1 (or
+`neon2c --no-cache`) turns the caches off.
+
+Parsed modules are also kept in memory, which is what makes a long-running
+`neon2c serve` daemon warm.
+
+hashlib, pickle and friends are imported where they are used: every neon2c
+invocation imports this module, but `dump tokens` never touches a cache.
+"""
+
+import os
+
+CACHE_DIR = os.path.expanduser(
+    os.getenv("NEON_CACHE_DIR") or os.path.join("~", ".neon", "cache")
+)
+ENABLED = not os.getenv("NEON_NO_CACHE")
+
+# the sources whose behaviour ends up in cached parse results
+_COMPILER_SOURCES = ("tokenizer.py", "nodes.py", "neon.py", "cache.py")
+
+_compiler_version: str | None = None
+_file_digests: dict[str, tuple[int, int, str]] = {}
+
+# parsed modules already loaded or stored by this process, oldest first
+MEMORY_LIMIT = 512
+_modules: dict[str, dict] = {}
+
+
+def compiler_version() -> str:
+    global _compiler_version
+    if _compiler_version is None:
+        import hashlib
+
+        here = os.path.dirname(os.path.abspath(__file__))
+        h = hashlib.sha256()
+        for name in _COMPILER_SOURCES:
+            with open(os.path.join(here, name), "rb") as f:
+                h.update(f.read())
+        _compiler_version = h.hexdigest()
+    return _compiler_version
+
+
+def digest(*parts) -> str:
+    import hashlib
+
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def file_digest(path: str) -> str | None:
+    """sha256 of a file's contents, or None if it can't be read."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    known = _file_digests.get(path)
+    if known and known[0] == st.st_mtime_ns and known[1] == st.st_size:
+        return known[2]
+    import hashlib
+
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                h.update(chunk)
+    except OSError:
+        return None
+    _file_digests[path] = (st.st_mtime_ns, st.st_size, h.hexdigest())
+    return h.hexdigest()
+
+
+def _path(kind: str, key: str) -> str:
+    return os.path.join(CACHE_DIR, kind, key[:2], key)
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    import tempfile
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+# --- parsed modules ---
+def load_module(key: str) -> dict | None:
+    """
+    A cached parse result, or None. Entries whose dependencies changed on
+    disk since they were stored count as misses.
+    """
+    if not ENABLED:
+        return None
+    entry = _modules.get(key)
+    if entry is None:
+        import pickle
+
+        try:
+            with open(_path("modules", key), "rb") as f:
+                entry = pickle.load(f)
+        except Exception:  # missing, truncated or written by another version
+            return None
+        _remember(key, entry)
+    for path, expected in entry["deps"]:
+        if file_digest(path) != expected:
+            return None
+    return entry
+
+
+def store_module(key: str, entry: dict) -> None:
+    """entry: {"deps": [(path, digest)], "items", "own", "types", "included"}"""
+    if not ENABLED:
+        return
+    _remember(key, entry)
+    import pickle
+
+    try:
+        _write_atomic(_path("modules", key), pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+    except OSError:
+        pass  # a read-only home shouldn't break the build
+
+
+def _remember(key: str, entry: dict) -> None:
+    _modules[key] = entry
+    while len(_modules) > MEMORY_LIMIT:
+        del _modules[next(iter(_modules))]
+
+
+# --- compiled executables and objects ---
+def tool_digest(program: str) -> str:
+    """Identify a tool binary (cc) by resolved path, size and mtime."""
+    import shutil
+
+    path = shutil.which(program)
+    if path is None:
+        return program
+    path = os.path.realpath(path)
+    st = os.stat(path)
+    return digest(path, st.st_size, st.st_mtime_ns)
+
+
+def _place(src: str, dest: str) -> None:
+    """Hardlink src to dest (copying across filesystems), replacing dest."""
+    import shutil
+
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    if os.path.exists(dest) and os.path.samefile(src, dest):
+        return  # already linked; rename() onto the same inode would be a no-op
+    tmp = f"{dest}.neon-tmp{os.getpid()}"
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dest)
+
+
+def restore_artifact(key: str, dest: str, kind: str = "bin") -> bool:
+    """Put the cached executable (or object, kind="obj") for key at dest."""
+    if not ENABLED:
+        return False
+    src = _path(kind, key)
+    if not os.path.isfile(src):
+        return False
+    try:
+        _place(src, dest)
+    except OSError:
+        return False
+    return True
+
+
+def store_artifact(key: str, src: str, kind: str = "bin") -> None:
+    if not ENABLED:
+        return
+    try:
+        _place(src, _path(kind, key))
+    except OSError:
+        pass
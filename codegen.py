@@ -0,0 +1,902 @@
+"""
+C code generation for Neon: turns the parser's AST into C text.
+
+neon2c drives it; it lives in its own module so that it is byte-compiled
+once instead of on every neon2c invocation, and so that commands that never
+generate C (dump) don't load it.
+"""
+
+from neon import *
+import io
+from typing import Callable
+
+decls = []
+
+
+def appendOnce(a: list, what):
+    if what not in a:
+        a.append(what)
+
+
+def convert_type(typ: str) -> str:
+    """
+    Convert Neon types to equivalent C types.
+    """
+    type_map = {
+        "number": "int",
+        "uint": "unsigned int",
+        "uchar": "unsigned char",
+        "ulong": "unsigned long",
+        "string": "const char*",
+        "boolean": "bool",
+        "pchar": "char*",
+    }
+    if typ in type_map:
+        return type_map[typ]
+    elif typ.startswith("ptr<") and typ.endswith(">"):
+        inner = convert_type(typ[4:-1])
+        return f"{inner}*"
+    elif typ.startswith("struct<") and typ.endswith(">"):
+        inner = convert_type(typ[7:-1])
+        return f"struct {inner}"
+    else:
+        return typ
+
+
+def get_array_info(type_str: str):
+    """
+    Helper to parse Array<Type, Size> strings.
+    Returns (base_type_c_string, size_string) if it's an array, else None.
+    """
+    if type_str.startswith("Array<") and type_str.endswith(">"):
+        content = type_str[6:-1]
+        if "," in content:
+            base, size = content.split(",", 1)
+            base = base.strip()
+            size = size.strip()
+            return convert_type(base), (size if size != "0" else "")
+    return None
+
+
+# Code generators by node type. Lookups are by exact type, so a backend
+# (or a new node) plugs in with @generates(TABLE, NodeType) instead of
+# growing an isinstance chain that every node has to walk.
+EXPR_GENERATORS: dict[type, Callable[[object], str]] = {}
+STATEMENT_GENERATORS: dict[type, Callable[[object], str]] = {}
+
+
+def generates(table: dict, *node_types: type):
+    """Register the decorated function as the generator of node_types in table."""
+
+    def register(fn):
+        for node_type in node_types:
+            table[node_type] = fn
+        return fn
+
+    return register
+
+
+def generate_expr(expr: object | None) -> str:
+    if expr is None:
+        return ""
+    handler = EXPR_GENERATORS.get(type(expr))
+    if handler is None:
+        raise Exception(f"Unknown expression type: {expr}")
+    return handler(expr)
+
+
+@generates(EXPR_GENERATORS, Num)
+def generate_num(expr: Num) -> str:
+    return str(expr.value)
+
+
+@generates(EXPR_GENERATORS, Str)
+def generate_str(expr: Str) -> str:
+    return f'"{expr.value}"'
+
+
+@generates(EXPR_GENERATORS, Bool)
+def generate_bool(expr: Bool) -> str:
+    return "true" if expr.value else "false"
+
+
+@generates(EXPR_GENERATORS, Var)
+def generate_var(expr: Var) -> str:
+    return expr.name
+
+
+@generates(EXPR_GENERATORS, MemberAccess)
+def generate_member_access(expr: MemberAccess) -> str:
+    return f"{generate_expr(expr.obj)}.{expr.member}"
+
+
+@generates(EXPR_GENERATORS, AttributeAccess)
+def generate_attribute_access(expr: AttributeAccess) -> str:
+    return f"{generate_expr(expr.obj)}->{expr.attribute}"
+
+
+@generates(EXPR_GENERATORS, IndexAccess)
+def generate_index_access(expr: IndexAccess) -> str:
+    return f"{generate_expr(expr.obj)}[{generate_expr(expr.index)}]"
+
+
+@generates(EXPR_GENERATORS, UnaryOp)
+def generate_unary(expr: UnaryOp) -> str:
+    operand = generate_expr(expr.operand)
+    if expr.op == "-" and operand.startswith("-"):
+        return f"- {operand}"  # not C's --
+    return f"{expr.op}{operand}"
+
+
+@generates(EXPR_GENERATORS, BinOp)
+def generate_binop(expr: BinOp) -> str:
+    left = generate_expr(expr.left)
+    right = generate_expr(expr.right)
+    return f"({left} {expr.op} {right})"
+
+
+@generates(EXPR_GENERATORS, Conditional)
+def generate_conditional(expr: Conditional) -> str:
+    condition = generate_expr(expr.condition)
+    then, otherwise = generate_expr(expr.then), generate_expr(expr.otherwise)
+    return f"({condition} ? {then} : {otherwise})"
+
+
+@generates(EXPR_GENERATORS, FuncCall)
+def generate_call(expr: FuncCall) -> str:
+    args = ", ".join(generate_expr(arg) for arg in expr.args)
+    return f"{expr.func_name}({args})"
+
+
+@generates(EXPR_GENERATORS, StructLiteral)
+def generate_struct_literal(expr: StructLiteral) -> str:
+    init_parts = []
+    for key, val in expr.fields:
+        val_str = generate_expr(val)
+        part = f".{key} = {val_str}" if key is not None else val_str
+        init_parts.append(part)
+    return "{" + ", ".join(init_parts) + "}"
+
+
+@generates(EXPR_GENERATORS, PCast, Cast)
+def generate_cast(expr: PCast | Cast) -> str:
+    # Both cast types behave similarly enough for C generation here
+    is_ptr = isinstance(expr, PCast)
+    cast_type = convert_type(expr.type_name) + ("*" if is_ptr else "")
+    return f"({cast_type}) {generate_expr(expr.expr)}"
+
+
+@generates(EXPR_GENERATORS, Char)
+def generate_char(expr: Char) -> str:
+    return f"{expr.value}"
+
+
+@generates(EXPR_GENERATORS, PreprocessorDirective)
+@generates(STATEMENT_GENERATORS, PreprocessorDirective)
+def generate_directive(node: PreprocessorDirective) -> str:
+    return node.directive
+
+
+@generates(EXPR_GENERATORS, Deref)
+def generate_deref(expr: Deref) -> str:
+    return f"*{expr.expr}"
+
+
+def generate_decl_common(
+    name: str, type_str: str, attr: str, init_expr: object | None, is_const: bool
+) -> str:
+    """
+    Shared logic for VarDecl and ConstDecl to avoid duplication.
+    """
+    prefix_parts = []
+    if attr == "@static":
+        prefix_parts.append("static")
+    if is_const:
+        prefix_parts.append("const")
+
+    prefix = " ".join(prefix_parts) + (" " if prefix_parts else "")
+
+    array_info = get_array_info(type_str)
+
+    if array_info:
+        base_type, size = array_info
+        code = f"{prefix}{base_type} {name}[{size}]"
+    else:
+        code = f"{prefix}{convert_type(type_str)} {name}"
+
+    if init_expr is not None:
+        code += " = " + generate_expr(init_expr)
+
+    return code + ";"
+
+
+def generate_statement(stmt: object) -> str:
+    handler = STATEMENT_GENERATORS.get(type(stmt))
+    if handler is None:
+        raise Exception(f"Unknown statement type: {stmt}")
+    return handler(stmt)
+
+
+@generates(STATEMENT_GENERATORS, VarDecl)
+def generate_var_decl(stmt: VarDecl) -> str:
+    return generate_decl_common(
+        stmt.name, stmt.var_type, stmt.var_attr, stmt.init_expr, is_const=False
+    )
+
+
+@generates(STATEMENT_GENERATORS, ConstDecl)
+def generate_const_decl(stmt: ConstDecl) -> str:
+    return generate_decl_common(
+        stmt.name, stmt.const_type, stmt.const_attr, stmt.init_expr, is_const=True
+    )
+
+
+@generates(STATEMENT_GENERATORS, Assignment)
+def generate_assignment(stmt: Assignment) -> str:
+    return f"{generate_expr(stmt.target)} {stmt.op} {generate_expr(stmt.expr)};"
+
+
+@generates(STATEMENT_GENERATORS, ReturnStmt)
+def generate_return(stmt: ReturnStmt) -> str:
+    return f"return {generate_expr(stmt.expr)};"
+
+
+@generates(STATEMENT_GENERATORS, ExprStmt)
+def generate_expr_stmt(stmt: ExprStmt) -> str:
+    return generate_expr(stmt.expr) + (
+        ";" if not isinstance(stmt.expr, PreprocessorDirective) else ""
+    )
+
+
+def render(write: Callable, stmt) -> str:
+    """
+    The C for stmt that the CWriter method write() writes, as a string: the
+    statements that nest are written by CWriter alone and the string
+    generators below just collect its output.
+    """
+    sink = io.StringIO()
+    write(CWriter(sink), stmt, 0)
+    # CWriter starts every line, the first one too, with its line break
+    return sink.getvalue()[1:]
+
+
+@generates(STATEMENT_GENERATORS, IfStmt)
+def generate_if(stmt: IfStmt) -> str:
+    return render(CWriter.if_, stmt)
+
+
+# `case` on strings hashes the target with 32-bit FNV-1a, switches on the
+# hash (its high half folded into the low one, since FNV's low bits only
+# depend on the low bits of the input) to the one case it can be and
+# compares against that case's string.
+# The seed and table size are picked at compile time so that no two cases
+# share a slot (a perfect hash); if none is found, the fullest slot compares
+# against more than one string.
+FNV_OFFSET = 2166136261
+FNV_PRIME = 16777619
+# strings up to this long are compared byte by byte, longer ones in a loop
+UNROLL_LIMIT = 16
+# int cases this many or more, spread over a range more than SPARSE_SPAN
+# times their count, are found by binary search over a sorted table
+SPARSE_MIN_CASES = 8
+SPARSE_SPAN = 16
+
+# lowered selectors nest inside each other's cases; their temporaries are
+# numbered by depth so an inner one doesn't shadow an outer one
+_selector_depth = 0
+
+
+def fnv1a(data: bytes, basis: int) -> int:
+    value = basis
+    for byte in data:
+        value = ((value ^ byte) * FNV_PRIME) & 0xFFFFFFFF
+    return value
+
+
+def perfect_hash(keys: list[bytes]) -> tuple[int, int, dict[int, list[int]]]:
+    """
+    (basis, mask, slot -> indexes of the keys in it) for the smallest
+    table and seed that give every key a slot of its own.
+    """
+    best = None
+    size = 1
+    while size < len(keys):
+        size *= 2
+    for mask in (size - 1, size * 2 - 1, size * 4 - 1, size * 8 - 1):
+        for seed in range(256):
+            basis = FNV_OFFSET ^ (seed * 0x9E3779B9 & 0xFFFFFFFF)
+            slots: dict[int, list[int]] = {}
+            for i, key in enumerate(keys):
+                value = fnv1a(key, basis)
+                slots.setdefault((value ^ value >> 16) & mask, []).append(i)
+            if len(slots) == len(keys):
+                return basis, mask, slots
+            fullest = max(map(len, slots.values()))
+            if best is None or fullest < best[0]:
+                best = (fullest, basis, mask, slots)
+    return best[1:]
+
+
+def string_match(name: str, key: bytes, arm: str, depth: str) -> list[str]:
+    """Lines that set arm if the string at name is key."""
+    if len(key) <= UNROLL_LIMIT:
+        test = " && ".join(f"{name}[{i}] == {byte}" for i, byte in enumerate(key + b"\0"))
+        return [f"if ({test}) {{", f"    {arm}", "}"]
+    index = f"_i{depth}"
+    literal = "".join(f"\\x{byte:02x}" for byte in key)
+    return [
+        f'for (int {index} = 0; {name}[{index}] == ((const unsigned char*) "{literal}")[{index}]; {index}++) {{',
+        f"    if (!{name}[{index}]) {{",
+        f"        {arm}",
+        "        break;",
+        "    }",
+        "}",
+    ]
+
+
+def lower_string_selector(stmt: SelectorStmt, depth: str) -> list[str]:
+    name, hash_, arm, char = f"_case{depth}", f"_hash{depth}", f"_arm{depth}", f"_c{depth}"
+    keys = [string_bytes(case.value.value) for case in stmt.cases]
+    basis, mask, slots = perfect_hash(keys)
+    lines = [
+        f"const unsigned char* {name} = (const unsigned char*) {generate_expr(stmt.target)};",
+        f"unsigned int {hash_} = {basis}u;",
+        f"for (const unsigned char* {char} = {name}; *{char}; {char}++) {{",
+        f"    {hash_} = ({hash_} ^ *{char}) * {FNV_PRIME}u;",
+        "}",
+        f"int {arm} = -1;",
+        f"switch (({hash_} ^ {hash_} >> 16) & {mask}u) {{",
+    ]
+    for slot in sorted(slots):
+        lines.append(f"case {slot}:")
+        for i in slots[slot]:
+            match = string_match(name, keys[i], f"{arm} = {i};", depth)
+            lines += ["    " + line for line in match]
+        lines.append("    break;")
+    lines.append("}")
+    return lines
+
+
+def lower_sparse_selector(stmt: SelectorStmt, depth: str) -> list[str]:
+    keys, arms, key, arm = f"_keys{depth}", f"_arms{depth}", f"_key{depth}", f"_arm{depth}"
+    lo, hi, mid = f"_lo{depth}", f"_hi{depth}", f"_mid{depth}"
+    table = sorted((case.value.value, i) for i, case in enumerate(stmt.cases))
+    return [
+        f"static const long long {keys}[] = {{{', '.join(str(k) for k, _ in table)}}};",
+        f"static const int {arms}[] = {{{', '.join(str(i) for _, i in table)}}};",
+        f"long long {key} = {generate_expr(stmt.target)};",
+        f"int {arm} = -1;",
+        f"for (int {lo} = 0, {hi} = {len(table)}; {lo} < {hi};) {{",
+        f"    int {mid} = ({lo} + {hi}) / 2;",
+        f"    if ({keys}[{mid}] < {key}) {{",
+        f"        {lo} = {mid} + 1;",
+        f"    }} else if ({keys}[{mid}] > {key}) {{",
+        f"        {hi} = {mid};",
+        "    } else {",
+        f"        {arm} = {arms}[{mid}];",
+        "        break;",
+        "    }",
+        "}",
+    ]
+
+
+def is_sparse(stmt: SelectorStmt) -> bool:
+    values = [case.value for case in stmt.cases]
+    if len(values) < SPARSE_MIN_CASES:
+        return False
+    if not all(type(v) is Num and type(v.value) is int for v in values):
+        return False
+    numbers = {v.value for v in values}
+    if len(numbers) != len(values):
+        return False  # cc reports the duplicate
+    return max(numbers) - min(numbers) + 1 > SPARSE_SPAN * len(values)
+
+
+def lower_selector(stmt: SelectorStmt) -> tuple[list[str], SelectorStmt] | None:
+    """
+    For a `case` a C switch can't do well (strings, very sparse ints): the
+    lines that work out which case matched, and the switch over case numbers
+    that runs its body. None for every other `case`.
+    """
+    if not stmt.cases:
+        return None
+    depth = str(_selector_depth) if _selector_depth else ""
+    if all(type(case.value) is Str for case in stmt.cases):
+        lines = lower_string_selector(stmt, depth)
+    elif is_sparse(stmt):
+        lines = lower_sparse_selector(stmt, depth)
+    else:
+        return None
+    cases = [CaseStmt(Num(i), case.body) for i, case in enumerate(stmt.cases)]
+    return lines, SelectorStmt(Var(f"_arm{depth}"), cases, stmt.default)
+
+
+@generates(STATEMENT_GENERATORS, SelectorStmt)
+def generate_selector(stmt: SelectorStmt) -> str:
+    return render(CWriter.selector, stmt)
+
+
+# loop attributes as the pragma lines that go in front of the loop (the
+# OpenMP ones are combined by openmp_pragma), and the cc flags a program
+# that uses them has to be compiled with
+LOOP_PRAGMAS: dict[str, Callable[[str], str]] = {
+    "@unroll": lambda count: f"#pragma GCC unroll {count}",
+    "@ivdep": lambda _: "#pragma GCC ivdep",
+}
+LOOP_CFLAGS = {"@vectorize": ["-fopenmp-simd"], "@parallel": ["-fopenmp"]}
+
+
+def openmp_pragma(attributes: list) -> str:
+    """The one OpenMP pragma that @parallel and @vectorize make together."""
+    directive = []
+    clauses = []
+    for attribute in attributes:
+        name, _, argument = attribute.partition("(")
+        if name == "@parallel":
+            directive[:0] = ["parallel", "for"]
+            for reduction in filter(None, argument.rstrip(")").split(",")):
+                clauses.append(f"reduction({reduction})")
+        elif name == "@vectorize":
+            directive.append("simd")
+    return " ".join(["#pragma omp", *directive, *clauses])
+
+
+def loop_pragmas(attributes: list) -> str:
+    # gcc wants an OpenMP pragma right before the loop, with no other pragma
+    # in between; simd and parallel for both promise no loop-carried
+    # dependences, so they cover @ivdep
+    if any(attribute.partition("(")[0] in OPENMP_ATTRIBUTES for attribute in attributes):
+        return openmp_pragma(attributes) + "\n"
+    lines = []
+    for attribute in attributes:
+        name, _, argument = attribute.partition("(")
+        lines.append(LOOP_PRAGMAS[name](argument.rstrip(")")) + "\n")
+    return "".join(lines)
+
+
+def for_condition(for_stmt: ForStmt) -> str:
+    condition = for_stmt.condition
+    if for_stmt.attributes and type(condition) is BinOp:
+        # OpenMP's canonical loop form doesn't allow (i < n)
+        return f"{generate_expr(condition.left)} {condition.op} {generate_expr(condition.right)}"
+    return generate_expr(condition)
+
+
+def required_cflags(items: list) -> list[str]:
+    """The cc flags the loop attributes in items need."""
+    flags = []
+    stack = [item.body for item in items if isinstance(item, FunctionDef)]
+    while stack:
+        for stmt in stack.pop():
+            kind = type(stmt)
+            if kind is ForStmt or kind is LoopStmt:
+                for attribute in stmt.attributes:
+                    for flag in LOOP_CFLAGS.get(attribute.partition("(")[0], ()):
+                        appendOnce(flags, flag)
+                stack.append(stmt.body)
+            elif kind is IfStmt:
+                stack += [stmt.true_body, stmt.false_body]
+            elif kind is SelectorStmt:
+                stack += [case.body for case in stmt.cases] + [stmt.default]
+    return flags
+
+
+@generates(STATEMENT_GENERATORS, LoopStmt)
+def generate_loop(loop_stmt: LoopStmt) -> str:
+    return render(CWriter.loop, loop_stmt)
+
+
+@generates(STATEMENT_GENERATORS, ForStmt)
+def generate_for(for_stmt: ForStmt) -> str:
+    return render(CWriter.for_, for_stmt)
+
+
+def generate_signature(
+    name: str,
+    ret_type: str,
+    args: list,
+    attributes: list = None,
+    is_definition: bool = True,
+) -> str:
+    """
+    Centralized function signature generation for both Definitions and Stubs.
+    """
+    attributes = attributes or []
+    ret_type_str = convert_type(ret_type) if ret_type else "void"
+    is_extern = "@extern" in attributes
+    is_always_inline = "@always_inline" in attributes
+    is_inline = is_always_inline or "@inline" in attributes
+    is_static = is_inline or "@static" in attributes
+
+    params = []
+    for arg in args:
+        if arg.variadic:
+            params.append("...")
+            break
+
+        array_info = get_array_info(arg.arg_type)
+        if array_info:
+            base, size = array_info
+            params.append(f"{base} {arg.name}[{size}]")
+        else:
+            params.append(f"{convert_type(arg.arg_type)} {arg.name}")
+
+    args_str = ", ".join(params) if params else "void"
+
+    prefix = ""
+    if is_extern:
+        prefix += "extern "
+    if is_static:
+        prefix += "static "
+    if is_inline:
+        prefix += "inline "
+    if is_always_inline:
+        prefix += "__attribute__((always_inline)) "
+
+    signature = f"{prefix}{ret_type_str} {name}({args_str})"
+    return signature
+
+
+def generate_proc(proc: FunctionDef) -> str:
+    # Add prototype to global decls if it's not main
+    # if proc.name != "main":
+    #    appendOnce(decls, signature + ";")
+
+    sink = io.StringIO()
+    CWriter(sink).proc(proc)
+    return sink.getvalue()
+
+
+def generate_stub(stub: StubDef) -> str:
+    # Stubs usually don't have 'static' in the prototype if they are meant for headers/forward decls,
+    # but we pass attributes just in case.
+    return (
+        generate_signature(stub.name, stub.ret_type, stub.args, stub.attributes) + ";"
+    )
+
+
+def generate_include(inc: Include) -> str:
+    header = inc.header[1:-1]
+    return f'#include "{header}.h"'
+
+
+def generate_struct(struct: TypeDef) -> str:
+    if not struct.fields:
+        return f"typedef struct {struct.name} {struct.name};"
+
+    field_lines = []
+    for name, typ, attrs in struct.fields:
+        at = " ".join(attr[1:] for attr in attrs) if attrs else ""
+        if at:
+            at = " " + at  # Pad if exists
+
+        array_info = get_array_info(typ)
+        if array_info:
+            base, size = array_info
+            field_lines.append(f"    {at}{base} {name}[{size}];")
+        else:
+            field_lines.append(f"    {at}{convert_type(typ)} {name};")
+
+    return f"typedef struct {{\n" + "\n".join(field_lines) + f"\n}} {struct.name};"
+
+
+def generate_enum(struct: TypeDef) -> str:
+    fields = []
+    for i, (fn, fv) in enumerate(struct.fields):
+        string = f"    {fn} = {fv}" if fv else f"    {fn}"
+        if i != len(struct.fields) - 1:
+            string += ","
+        fields.append(string)
+
+    return f"enum {struct.name} {{\n" + "\n".join(fields) + "\n};"
+
+
+def generate_define(defn: Define) -> str:
+    return f"#define {defn.name} {generate_expr(defn.value)}"
+
+
+# C text of top-level items by node identity. Modules that come out of the
+# in-memory module cache are the same objects as last time, so a daemon or
+# `watch` only regenerates items from files that changed. The node is kept
+# next to its text so its id can't be reused while the entry is alive.
+_generated: dict[int, tuple[object, str]] = {}
+
+
+def keep_generated(items: list) -> None:
+    """Drop memoized C text for every node that isn't in items."""
+    live = {id(item) for item in items}
+    for key in [key for key in _generated if key not in live]:
+        del _generated[key]
+
+
+def generate_top_level(item) -> str:
+    known = _generated.get(id(item))
+    if known is not None and known[0] is item:
+        return known[1]
+    handler = TOP_LEVEL.get(type(item))
+    if handler is None:
+        raise Exception(f"Unknown top-level item: {item}")
+    text = handler(item)
+    _generated[id(item)] = (item, text)
+    return text
+
+
+TOP_LEVEL = {
+    PreprocessorDirective: lambda item: item.directive,
+    Include: generate_include,
+    TypeDef: generate_struct,
+    EnumDef: generate_enum,
+    Define: generate_define,
+    FunctionDef: generate_proc,
+    VarDecl: generate_statement,
+    ConstDecl: generate_statement,
+    StubDef: generate_stub,
+}
+
+
+def generate_c(ast: Program) -> str:
+    return "\n\n".join(generate_top_level(item) for item in ast.items)
+
+
+def generate_extern(item: VarDecl | ConstDecl) -> str:
+    if isinstance(item, VarDecl):
+        return "extern " + generate_decl_common(item.name, item.var_type, None, None, False)
+    return "extern " + generate_decl_common(item.name, item.const_type, None, None, True)
+
+
+INLINE_ATTRIBUTES = frozenset({"@inline", "@always_inline"})
+
+
+def split_module(items: list) -> tuple[str, str]:
+    """
+    Split one module's items into the text of its header and its source file.
+    Definitions stay in the .c; the header carries types, macros, prototypes
+    (the stubs the parser made) and extern declarations for globals, so other
+    modules can be compiled against it. @inline functions are defined in the
+    header, so every module that calls them can inline them.
+    """
+    header, source = [], []
+    for item in items:
+        if isinstance(item, FunctionDef):
+            if INLINE_ATTRIBUTES.intersection(item.attributes):
+                header.append(generate_top_level(item))
+            else:
+                source.append(generate_top_level(item))
+        elif isinstance(item, (VarDecl, ConstDecl)):
+            attr = item.var_attr if isinstance(item, VarDecl) else item.const_attr
+            if attr != "@static":
+                header.append(generate_extern(item))
+            source.append(generate_top_level(item))
+        elif isinstance(item, StubDef) and "@static" in item.attributes:
+            source.append(generate_top_level(item))
+        elif isinstance(item, BenchDef):
+            continue  # only `neon2c bench` builds these
+        else:
+            header.append(generate_top_level(item))
+    return "\n\n".join(header), "\n\n".join(source)
+
+
+# `neon2c bench`: every bench block becomes a function the harness times in
+# batches. printf is __builtin_printf so the harness neither needs stdio.h
+# (whose FILE clashes with stdlib.neon's) nor a prototype of its own.
+BENCH_PRELUDE = """#include <time.h>
+
+/* keeps x alive (and everything it was computed from) without using it;
+   bench_sink(&a) makes what a bench writes to a live */
+#define bench_sink(x) __asm__ volatile("" : : "g"(x) : "memory")
+/* x, as a value the C compiler can't see through (or fold) */
+#define bench_opaque(x) ({ __typeof__(x) neon_opaque = (x); __asm__ volatile("" : "+rm"(neon_opaque)); neon_opaque; })
+
+static double neon_bench_now(void) {
+    struct timespec t;
+    clock_gettime(CLOCK_MONOTONIC, &t);
+    return t.tv_sec * 1e9 + t.tv_nsec;
+}
+
+static double neon_bench_batch(void (*bench)(void), long n) {
+    double start = neon_bench_now();
+    for (long i = 0; i < n; i++)
+        bench();
+    return neon_bench_now() - start;
+}
+
+static long neon_bench_arg(const char* s) {
+    long n = 0;
+    while (*s >= '0' && *s <= '9')
+        n = n * 10 + (*s++ - '0');
+    return n;
+}"""
+
+# usage: SAMPLES BATCH_MS WARMUP_MS INDEX...; prints, for each index,
+# "bench INDEX ITERATIONS NS..." with the ns per iteration of every sample.
+# Batches double in size until one takes BATCH_MS, for at least WARMUP_MS.
+BENCH_MAIN = """if (argc < 4) {
+    __builtin_printf("usage: %s SAMPLES BATCH_MS WARMUP_MS INDEX...\\n", argv[0]);
+    return 2;
+}
+long samples = neon_bench_arg(argv[1]);
+double batch = neon_bench_arg(argv[2]) * 1e6;
+double warmup = neon_bench_arg(argv[3]) * 1e6;
+for (int a = 4; a < argc; a++) {
+    long index = neon_bench_arg(argv[a]);
+    void (*bench)(void) = neon_benches[index];
+    long n = 1;
+    double start = neon_bench_now();
+    for (;;) {
+        double elapsed = neon_bench_batch(bench, n);
+        if (elapsed >= batch && neon_bench_now() - start >= warmup)
+            break;
+        if (elapsed < batch)
+            n *= elapsed * 10 < batch ? 10 : 2;
+    }
+    __builtin_printf("bench %ld %ld", index, n);
+    for (long s = 0; s < samples; s++)
+        __builtin_printf(" %.3f", neon_bench_batch(bench, n) / n);
+    __builtin_printf("\\n");
+}
+return 0;"""
+
+# the end of every iteration: memory the bench wrote has to be written
+BENCH_BARRIER = '__asm__ volatile("" : : : "memory");'
+
+
+def bench_program(items: list, benches: list) -> list:
+    """
+    items (without their main) followed by a function for every bench in
+    benches, the table of them and the harness main that times them.
+    """
+    functions = [
+        FunctionDef(
+            f"neon_bench_{i}",
+            "void",
+            ["@static"],
+            [],
+            [*bench.body, PreprocessorDirective(BENCH_BARRIER)],
+        )
+        for i, bench in enumerate(benches)
+    ]
+    table = ", ".join(function.name for function in functions)
+    main = FunctionDef(
+        "main",
+        "int",
+        [],
+        [ArgDef("argc", "int"), ArgDef("argv", "ptr<pchar>")],
+        [PreprocessorDirective(BENCH_MAIN)],
+    )
+    return [
+        PreprocessorDirective(BENCH_PRELUDE),
+        *(item for item in items if not (type(item) is FunctionDef and item.name == "main")),
+        *functions,
+        PreprocessorDirective(f"static void (*const neon_benches[])(void) = {{{table}}};"),
+        main,
+    ]
+
+
+class CWriter:
+    """
+    Writes C to a sink (anything with .write(str): a file, a pipe, a
+    StringIO) in one pass, one top-level item at a time. Function bodies are
+    written line by line at their depth instead of being built as strings
+    and re-indented at every nesting level, which made codegen quadratic in
+    nesting depth. The output is byte for byte what generate_c() returns.
+    """
+
+    def __init__(self, sink) -> None:
+        self.sink = sink
+        self.items = 0
+        self.lines = 0
+
+    def program(self, items: list) -> None:
+        for item in items:
+            self.item(item)
+
+    def item(self, item) -> None:
+        if self.items:
+            self.sink.write("\n\n")
+        self.items += 1
+        self.sink.write(generate_top_level(item))
+
+    def proc(self, proc: FunctionDef) -> None:
+        signature = generate_signature(
+            proc.name, proc.ret_type, proc.args, proc.attributes
+        )
+        body = []
+        for stmt in proc.body:
+            body.append(stmt)
+            if isinstance(stmt, ReturnStmt):
+                break
+        self.sink.write(signature + " {")
+        self.block(body, 1)
+        self.sink.write("\n}")
+
+    # Text is split with splitlines(), a line gets one indent per level
+    # unless it is blank, and a block that produces no lines still leaves an
+    # empty one.
+    def line(self, text: str, depth: int) -> None:
+        self.lines += 1
+        self.sink.write("\n" + ("    " * depth + text if text.strip() else text))
+
+    def text(self, text: str, depth: int) -> None:
+        for line in text.splitlines():
+            self.line(line, depth)
+
+    def block(self, stmts: list, depth: int) -> None:
+        lines = self.lines
+        last = len(stmts) - 1
+        for i, stmt in enumerate(stmts):
+            self.statement(stmt, depth, i == last)
+        if self.lines == lines:
+            self.line("", depth)
+
+    def statement(self, stmt, depth: int, last: bool) -> None:
+        # a handler registered in STATEMENT_GENERATORS over one of the
+        # generators below wins, the same as on the string path
+        write = STREAMED.get(STATEMENT_GENERATORS.get(type(stmt)))
+        if write is not None:
+            write(self, stmt, depth)
+        else:
+            # a statement's trailing line break survives unless it ends the block
+            text = generate_statement(stmt)
+            self.text(text if last else text + "\n", depth)
+
+    def loop(self, stmt: LoopStmt, depth: int) -> None:
+        self.text(loop_pragmas(stmt.attributes), depth)
+        self.text(f"while ({generate_expr(stmt.condition)}) {{", depth)
+        self.block(stmt.body, depth + 1)
+        self.line("}", depth)
+
+    def for_(self, stmt: ForStmt, depth: int) -> None:
+        init = generate_statement(stmt.init).rstrip(";")
+        cond = for_condition(stmt)
+        upd = generate_statement(stmt.update).rstrip(";")
+        self.text(loop_pragmas(stmt.attributes), depth)
+        self.text(f"for ({init}; {cond}; {upd}) {{", depth)
+        self.block(stmt.body, depth + 1)
+        self.line("}", depth)
+
+    def selector(self, stmt: SelectorStmt, depth: int) -> None:
+        global _selector_depth
+        lowered = lower_selector(stmt)
+        if lowered is not None:
+            lines, dispatch = lowered
+            self.line("{", depth)
+            self.text("\n".join(lines), depth + 1)
+            _selector_depth += 1
+            try:
+                self.selector(dispatch, depth + 1)
+            finally:
+                _selector_depth -= 1
+            self.line("}", depth)
+        else:
+            self.text(f"switch ({generate_expr(stmt.target)}) {{", depth)
+            for case in stmt.cases:
+                self.text(f"case {generate_expr(case.value)}:", depth)
+                if case.body:
+                    self.block(case.body, depth + 1)
+                    self.line("break;", depth + 1)
+            self.line("default:", depth)
+            self.block(stmt.default, depth + 1)
+            self.line("break;", depth + 1)
+            self.line("}", depth)
+
+    def if_(self, stmt: IfStmt, depth: int, prefix: str = "") -> None:
+        self.text(f"{prefix}if ({generate_expr(stmt.condition)}) {{", depth)
+        self.block(stmt.true_body, depth + 1)
+        if not stmt.false_body:
+            self.line("}", depth)
+        elif len(stmt.false_body) == 1 and isinstance(stmt.false_body[0], IfStmt):
+            self.if_(stmt.false_body[0], depth, "} else ")
+        else:
+            self.line("} else {", depth)
+            self.block(stmt.false_body, depth + 1)
+            self.line("}", depth)
+
+
+# the generators that only collect what a CWriter method writes, and the
+# method, which CWriter calls directly to write at its own depth
+STREAMED: dict[Callable[[object], str], Callable] = {
+    generate_if: CWriter.if_,
+    generate_loop: CWriter.loop,
+    generate_for: CWriter.for_,
+    generate_selector: CWriter.selector,
+}
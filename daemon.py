@@ -0,0 +1,208 @@
+"""
+Compiler daemon for neon2c.
+
+`neon2c serve` keeps one process around with the compiler already imported
+and parsed modules held in memory (see cache.py), and answers compile
+requests on a Unix socket. When $NEON_DAEMON names that socket, `neon2c`
+forwards its command line there instead of starting the compiler itself,
+and falls back to compiling locally if nobody is listening.
+
+Requests are handled one at a time: the parser keeps its state in module
+globals, which neon.reset() clears between them.
+"""
+
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import stat
+import struct
+import subprocess
+import sys
+import tempfile
+import traceback
+
+# read once when neon/tokenizer/cache are imported, so a client that sets
+# them differently than the daemon did is compiled locally instead
+CONFIG_ENV = (
+    "NEON_HOME",
+    "NEON_PLATFORM",
+    "NEON_TOKENIZER",
+    "NEON_CACHE_DIR",
+    "NEON_NO_CACHE",
+)
+
+
+def default_socket() -> str:
+    """
+    $XDG_RUNTIME_DIR/neon2c.sock, else daemon.sock in a 0700 directory of
+    our own in the temp dir: anyone who could put a socket where clients
+    look would get their environment and could have them run anything.
+    """
+    runtime = os.getenv("XDG_RUNTIME_DIR")
+    if runtime:
+        return os.path.join(runtime, "neon2c.sock")
+    directory = os.path.join(tempfile.gettempdir(), f"neon2c-{os.getuid()}")
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        sys.exit(f"{directory} isn't a private directory of this user; pass --socket")
+    return os.path.join(directory, "daemon.sock")
+
+
+def _owned_by_us(sock: socket.socket, path: str) -> bool:
+    """True if the socket at path, and the process listening on it, are ours."""
+    st = os.stat(path)
+    if not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.getuid():
+        return False
+    if hasattr(socket, "SO_PEERCRED"):
+        credentials = sock.getsockopt(
+            socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+        )
+        _, uid, _ = struct.unpack("3i", credentials)
+        return uid == os.getuid()
+    return True
+
+
+def _send(sock: socket.socket, message: dict) -> None:
+    data = json.dumps(message).encode()
+    sock.sendall(struct.pack("!I", len(data)) + data)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("daemon connection closed")
+        data += chunk
+    return bytes(data)
+
+
+def _recv(sock: socket.socket) -> dict:
+    (size,) = struct.unpack("!I", _recv_exact(sock, 4))
+    return json.loads(_recv_exact(sock, size))
+
+
+# --- client ---
+def forward(path: str, argv: list[str]) -> int | None:
+    """
+    Run a neon2c command line on the daemon listening at path. Returns the
+    exit code, or None when the daemon can't take the request and the caller
+    should compile locally.
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+            # nothing (the environment least of all) goes to someone else's
+            if not _owned_by_us(sock, path):
+                return None
+            _send(sock, {"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)})
+            reply = _recv(sock)
+    except (OSError, ValueError):
+        return None
+    if reply.get("fallback"):
+        return None
+
+    sys.stdout.write(reply["stdout"])
+    sys.stdout.flush()
+    sys.stderr.write(reply["stderr"])
+    sys.stderr.flush()
+    # `run` executes the program here, attached to the client's terminal
+    if reply["code"] == 0 and reply.get("execute"):
+        subprocess.run([reply["execute"]])
+    return reply["code"]
+
+
+# --- server ---
+def _exit_code(exit: SystemExit) -> int:
+    if exit.code is None:
+        return 0
+    if isinstance(exit.code, int):
+        return exit.code
+    print(exit.code, file=sys.stderr)
+    return 1
+
+
+def _handle(request: dict, config: dict, compile_main) -> dict:
+    env = request["env"]
+    if any(env.get(name) != value for name, value in config.items()):
+        return {"fallback": True}
+
+    saved_env, saved_cwd = dict(os.environ), os.getcwd()
+    stdout, stderr = io.StringIO(), io.StringIO()
+    code, execute = 0, None
+    try:
+        # cc and friends should see the client's environment, not ours
+        os.environ.clear()
+        os.environ.update(env)
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                os.chdir(request["cwd"])
+                execute = compile_main(request["argv"])
+            except SystemExit as exit:
+                code = _exit_code(exit)
+            except Exception:
+                traceback.print_exc()
+                code = 1
+    finally:
+        os.environ.clear()
+        os.environ.update(saved_env)
+        os.chdir(saved_cwd)
+    return {
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+        "code": code,
+        "execute": execute,
+    }
+
+
+def serve(path: str, compile_main) -> None:
+    """
+    Answer requests on path until interrupted. compile_main(argv) runs one
+    neon2c command line and returns the executable `run` should start, if any.
+    """
+    if os.path.exists(path):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(path)
+            except OSError:
+                os.unlink(path)  # left behind by a daemon that died
+            else:
+                sys.exit(f"a neon2c daemon is already listening on {path}")
+
+    config = {name: os.environ.get(name) for name in CONFIG_ENV}
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # created 0600 rather than chmod-ed after bind, which leaves a window
+    umask = os.umask(0o077)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(umask)
+    server.listen()
+    print(f"[neon] daemon listening on {path}", file=sys.stderr)
+    # let `kill` clean up the socket too
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    request = _recv(conn)
+                except (OSError, ValueError):
+                    continue
+                reply = _handle(request, config, compile_main)
+                try:
+                    _send(conn, reply)
+                except OSError:
+                    pass  # the client went away
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.unlink(path)
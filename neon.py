@@ -1,8 +1,16 @@
 #!/usr/bin/env python3
-from tokenizer import tokenize, KEYWORDS
+from tokenizer import tokenize, KEYWORDS, TokenStore
+import tokenizer
 import sys
 import os
+import contextlib
+import gc
+import io
+import re
+import threading
 from nodes import *
+import cache
+import timing
 
 sections = {"code": [], "decls": []}
 
@@ -37,6 +45,7 @@ RETURN_FROM_PROCEDURE = "return"
 
 # Other
 SELECTOR_STATEMENT = "case"
+BENCH_BLOCK = "bench"
 
 
 # Booleans
@@ -60,6 +69,7 @@ _KEYWORDS = {
     CONDITIONAL_IS,
     RETURN_FROM_PROCEDURE,
     SELECTOR_STATEMENT,
+    BENCH_BLOCK,
     BOOLEAN_TRUE,
     BOOLEAN_FALSE,
     ABISTRACT_TYPE_DEF,
@@ -84,6 +94,44 @@ GENERIC_TYPES = {
     "Cast",
     "struct",
 }  # this list is used to bypass type checking, since they are used like: Array<int, 3>, ptr<int>, etc
+# the names parse_generic() takes a <...> argument list after
+GENERIC_FORMS = GENERIC_TYPES | {"Raw"}
+
+# binding power of each binary operator, tightest last. these follow C, so
+# the BinOps the parser builds mean the same thing as the C they turn into
+BINARY_PRECEDENCE = {
+    "||": 1,
+    "&&": 2,
+    "|": 3,
+    "&": 4,
+    "==": 5,
+    "!=": 5,
+    "<": 6,
+    ">": 6,
+    "<=": 6,
+    ">=": 6,
+    "+": 7,
+    "-": 7,
+    "*": 8,
+    "/": 8,
+    "%": 8,
+}
+# attributes a for/while loop can have, and the argument each takes (a
+# loop attribute is written like "@unroll(4)", as one ATTR token):
+# "count" is required, "reductions" (like "+:total,max:top") is optional
+LOOP_ATTRIBUTES = {
+    "@unroll": "count",
+    "@vectorize": None,
+    "@ivdep": None,
+    "@parallel": "reductions",
+}
+# the ones that only make sense on a counted for loop
+FOR_ONLY_ATTRIBUTES = frozenset({"@vectorize", "@parallel"})
+# the ones that become OpenMP pragmas, which no GCC loop pragma can precede
+OPENMP_ATTRIBUTES = frozenset({"@vectorize", "@parallel"})
+REDUCTION_OPERATORS = frozenset({"+", "*", "&", "|", "&&", "||", "max", "min"})
+PREFIX_OPERATORS = frozenset({"&", "!", "-"})
+POSTFIX_OPERATORS = frozenset({".", ":", "["})
 TYPES = {
     "int",
     "double",
@@ -97,27 +145,174 @@ TYPES = {
     "uchar",
 }
 
+_BUILTIN_TYPES = frozenset(TYPES)
+
+
+C_ESCAPES = {"n": 10, "t": 9, "r": 13, "0": 0, "a": 7, "b": 8, "f": 12, "v": 11, "e": 27}
+
+
+def string_bytes(literal: str) -> bytes:
+    """The bytes the C string literal "literal" holds (without its NUL)."""
+    out = bytearray()
+    text = literal.encode()
+    i = 0
+    while i < len(text):
+        byte = text[i]
+        i += 1
+        if byte != ord("\\") or i == len(text):
+            out.append(byte)
+            continue
+        escape = chr(text[i])
+        i += 1
+        if escape == "x":
+            end = i
+            while end < len(text) and chr(text[end]) in "0123456789abcdefABCDEF":
+                end += 1
+            out.append(int(text[i:end], 16) & 0xFF)
+            i = end
+        elif escape in "01234567":
+            end = i
+            while end < i + 2 and end < len(text) and chr(text[end]) in "01234567":
+                end += 1
+            out.append(int(text[i - 1 : end], 8) & 0xFF)
+            i = end
+        else:
+            out.append(C_ESCAPES.get(escape, ord(escape)))
+    return bytes(out)
+
+
+class ModuleResolver:
+    """
+    Finds the file behind `import "name"`. Every import path is listed once
+    and lookups are memoized, instead of stat()ing each path for each import.
+    reset() drops what it learned, so a daemon or `watch` sees new modules.
+    """
+
+    def __init__(self, paths: list[str]) -> None:
+        self.paths = paths
+        self._listings: dict[str, frozenset[str]] = {}
+        self._found: dict[str, str | None] = {}
+
+    def clear(self) -> None:
+        self._listings.clear()
+        self._found.clear()
+
+    def _listing(self, root: str) -> frozenset[str]:
+        listing = self._listings.get(root)
+        if listing is None:
+            try:
+                with os.scandir(root) as entries:
+                    listing = frozenset(
+                        entry.name
+                        for entry in entries
+                        if entry.name.endswith(".neon") and entry.is_file()
+                    )
+            except OSError:
+                listing = frozenset()
+            self._listings[root] = listing
+        return listing
+
+    def resolve(self, file: str) -> str | None:
+        """Path of file (e.g. "stdlib.neon") in the first import path that has it."""
+        if file in self._found:
+            return self._found[file]
+        nested = os.sep in file or (os.altsep is not None and os.altsep in file)
+        found = None
+        for fpath in self.paths:
+            root = os.path.expanduser(fpath)
+            if nested:
+                # only top-level directories are indexed
+                hit = os.path.isfile(os.path.join(root, file))
+            else:
+                hit = file in self._listing(root)
+            if hit:
+                found = os.path.join(root, file)
+                break
+        self._found[file] = found
+        return found
+
+
+resolver = ModuleResolver(IMPORT_PATHS)
+
+
+def reset() -> None:
+    """Forget every module and type seen so far, so one process can compile again."""
+    filesIncluded.clear()
+    TYPES.clear()
+    TYPES.update(_BUILTIN_TYPES)
+    resolver.clear()
+    stop_parallel_imports()
+
+
+def module_cache_key(file_name: str) -> str | None:
+    """
+    Key for the parsed-module cache. Parsing a module depends on more than
+    its text: platform blocks are resolved against currentPlatform, imports
+    already in filesIncluded are skipped, and type names are checked
+    against TYPES, so all of that goes into the key.
+    """
+    if not cache.ENABLED:
+        return None
+    content = cache.file_digest(file_name)
+    if content is None:
+        return None
+    return cache.digest(
+        cache.compiler_version(),
+        currentPlatform,
+        os.getcwd(),
+        os.pathsep.join(IMPORT_PATHS),
+        file_name,
+        content,
+        "\n".join(sorted(filesIncluded)),
+        "\n".join(sorted(TYPES)),
+    )
+
 
 # --- Parser ---
 class Parser:
-    def __init__(self, tokens: List[Token], code: str, fileDir, filePath) -> None:
+    def __init__(
+        self, tokens: List[Token] | TokenStore, code: str | None, fileDir, filePath
+    ) -> None:
         self.tokens = tokens
+        self.count = len(tokens)
         self.pos = 0
-        self.lines = code.splitlines()  # store code lines for context
+        # source text for error context, split only when an error is reported.
+        # None means "ask the TokenStore"
+        self.code = code
         self.dir = fileDir
         self.file_name = filePath
+        # current() is asked for the same position several times in a row,
+        # and a TokenStore builds a Token on every lookup
+        self._current_pos = -1
+        self._current = None
+        # top-level items written in this file, as opposed to ones pulled in
+        # by its imports (filled by parse)
+        self.own_items: List[object] = []
+        # set to a list by parse_deferred(): type checks and imports are then
+        # recorded here instead of run against TYPES and filesIncluded
+        self.events: list | None = None
 
     def current(self) -> Optional[Token]:
-        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+        pos = self.pos
+        if pos != self._current_pos:
+            self._current = self.tokens[pos] if pos < self.count else None
+            self._current_pos = pos
+        return self._current
 
     def lookahead(self, offset: int = 1) -> Optional[Token]:
         pos = self.pos + offset
-        return self.tokens[pos] if pos < len(self.tokens) else None
+        return self.tokens[pos] if pos < self.count else None
 
     def error(self, msg: str, token) -> NoReturn:
+        if self.code is None and not self.count:
+            # a replayed module has no tokens of its own
+            with open(self.file_name) as f:
+                self.code = f.read()
+        code = self.code if self.code is not None else self.tokens.text()
+        lines = code.splitlines()
         line_text = ""
-        if token and token.line - 1 < len(self.lines):
-            line_text = self.lines[token.line - 1]
+        if token and token.line - 1 < len(lines):
+            line_text = lines[token.line - 1]
         ParserError(msg, token, line_text)
         exit(1)
 
@@ -156,6 +351,7 @@ class Parser:
     def parse(self) -> Program:
         decls = []
         code = []
+        imported = set()
 
         while self.current() is not None:
             token = self.current()
@@ -183,10 +379,24 @@ class Parser:
             elif token.type == PROCEDURE_DEFINITION:
                 decls.append(self.parse_stub())
 
+            elif token.type == BENCH_BLOCK:
+                bench = self.parse_bench()
+                if any(type(item) is BenchDef and item.name == bench.name for item in code):
+                    self.error(f'bench "{bench.name}" is defined twice', token)
+                code.append(bench)
+
+            elif token.type == IMPORT_FILE and self.events is not None:
+                # the same marker goes into both lists; replay() splices the
+                # imported decls and functions in where it sits
+                marker = self.defer_import()
+                decls.append(marker)
+                code.append(marker)
+
             elif token.type == IMPORT_FILE:
                 # Parse imported file
                 imported_items = self.parse_import()
                 if imported_items:
+                    imported.update(map(id, imported_items))
                     # Separate imported items into decls and code to maintain correct order
                     # The imported_items list is already decls + code, so we iterate and sort
                     for item in imported_items:
@@ -214,7 +424,10 @@ class Parser:
             elif token.type == ABISTRACT_TYPE_DEF:
                 self.consume(ABISTRACT_TYPE_DEF)
                 name = self.consume("ID").value
-                TYPES.add(name)
+                if self.events is not None:
+                    self.events.append(("abstract", name))
+                else:
+                    TYPES.add(name)
             elif token.type == DEFINE_MACRO:
                 decls.append(self.parse_define())
             elif token.type == DECLARE_VARIABLE:
@@ -224,8 +437,13 @@ class Parser:
             else:
                 self.error(f"Unexpected token at top level: {token.type}", token)
 
+        if self.events is not None:
+            self.deferred = (decls, code)
+
         # Return combined program with declarations first, then code
-        return Program(decls + code)
+        items = decls + code
+        self.own_items = [item for item in items if id(item) not in imported]
+        return Program(items)
 
     def parse_preprocessor_directive(self) -> PreprocessorDirective:
         token = self.consume(PP_DIRECTIVE)
@@ -253,36 +471,86 @@ class Parser:
         # Consume the string containing the filename.
         sourceT = self.current()
         token = self.consume("STRING")
+        return self.import_module(token, sourceT)
+
+    def defer_import(self) -> tuple:
+        self.consume(IMPORT_FILE)
+        sourceT = self.current()
+        token = self.consume("STRING")
+        event = ("import", token, sourceT)
+        self.events.append(event)
+        return event
+
+    def import_module(self, token: Token, sourceT: Token) -> List[object] | None:
         p = token.value + ".neon"
-        file_name = os.path.join(self.dir, p)
-        file_name = os.path.realpath(file_name)
-        exists = False
-
-        for fpath in IMPORT_PATHS:
-            fpath = os.path.expanduser(fpath)
-            if os.path.isfile(os.path.join(fpath, p)):
-                exists = True
-                file_name = os.path.join(fpath, p)
-                break
-        if filesIncluded.get(file_name, None) is not None:
+        file_name = resolver.resolve(p)
+        if file_name is not None and filesIncluded.get(file_name, None) is not None:
             # print(f"{self.file_name}:{token.line+1}: \"{file_name}\" was imported before by \"{filesIncluded[file_name]["path"]}\"")
             # print(f"{filesIncluded[file_name]["path"]}:{filesIncluded[file_name]["line"]+1}: first time \"{file_name}\" was imported")
             return None
 
-        if not exists:
+        if file_name is None:
             self.error(f'there should be a "{p}" in {IMPORT_PATHS}', sourceT)
 
-        code = ""
-        try:
-            with open(file_name, "r") as f:
-                code = f.read()
-        except IOError as error:
-            self.error(f"Could not open import file '{file_name}': {error}", sourceT)
-        tokens = tokenize(code, file_name)
-        imported_parser = Parser(tokens, code, os.path.dirname(file_name), file_name)
-        imported_ast = imported_parser.parse()
+        with timing.phase("import", file_name):
+            return self.load_import(file_name, token, sourceT)
+
+    def load_import(
+        self, file_name: str, token: Token, sourceT: Token
+    ) -> List[object] | None:
+        key = module_cache_key(file_name)
+        entry = cache.load_module(key) if key else None
+        if entry is not None:
+            TYPES.update(entry["types"])
+            filesIncluded.update(entry["included"])
+            filesIncluded[file_name] = {
+                "path": self.file_name,
+                "line": token.line,
+                "items": entry["own"],
+            }
+            return entry["items"]
+
+        types_before = set(TYPES)
+        included_before = set(filesIncluded)
+        deferred = _preparser.get(file_name) if _preparser else None
+        if deferred is not None:
+            imported_parser = Parser([], None, os.path.dirname(file_name), file_name)
+            imported_ast = imported_parser.replay(deferred)
+        else:
+            try:
+                with timing.phase("tokenize", file_name):
+                    tokens = TokenStore.from_file(file_name)
+            except IOError as error:
+                self.error(f"Could not open import file '{file_name}': {error}", sourceT)
+            imported_parser = Parser(tokens, None, os.path.dirname(file_name), file_name)
+            imported_ast = imported_parser.parse()
         # Return the list of items in the imported AST to be merged into the current AST.
-        filesIncluded[file_name] = {"path": self.file_name, "line": token.line}
+        # "items" keeps the module's own items apart for separate compilation
+        filesIncluded[file_name] = {
+            "path": self.file_name,
+            "line": token.line,
+            "items": imported_parser.own_items,
+        }
+
+        if key:
+            # nested imports were inlined into these items, so they are
+            # dependencies of the entry too
+            included = {
+                path: info
+                for path, info in filesIncluded.items()
+                if path not in included_before and path != file_name
+            }
+            deps = [(path, cache.file_digest(path)) for path in [file_name, *included]]
+            cache.store_module(
+                key,
+                {
+                    "deps": deps,
+                    "items": imported_ast.items,
+                    "own": imported_parser.own_items,
+                    "types": TYPES - types_before,
+                    "included": included,
+                },
+            )
         # we could add a #pragma once handler into the language, since it aims to be like C
         # but without all of the boiler plate
 
@@ -290,6 +558,56 @@ class Parser:
         # and handle them acordingly in the parser level
         return imported_ast.items
 
+    def replay(self, deferred: dict) -> Program:
+        """
+        Finish a module a worker parsed with parse_deferred(): run its type
+        checks and imports against the shared state at the points the serial
+        parse would have, then splice the imported items in.
+        """
+        expanded = {}
+        for event in deferred["events"]:
+            kind = event[0]
+            if kind == "use":
+                if event[1] not in GENERIC_TYPES and event[1] not in TYPES:
+                    self.fail(f"Unknown type '{event[1]}'", event[2])
+            elif kind == "define":
+                if event[1] in TYPES:
+                    self.fail(f"Type {event[1]} already defined", event[2])
+                TYPES.add(event[1])
+            elif kind == "abstract":
+                TYPES.add(event[1])
+            else:
+                expanded[id(event)] = self.import_module(event[1], event[2]) or []
+
+        decls, code = deferred["decls"], deferred["code"]
+        own_decls = [item for item in decls if type(item) is not tuple]
+        own_code = [item for item in code if type(item) is not tuple]
+        self.own_items = own_decls + own_code
+        # markers are the import events themselves
+        decls = [
+            new
+            for item in decls
+            for new in (
+                [i for i in expanded[id(item)] if not isinstance(i, FunctionDef)]
+                if type(item) is tuple
+                else [item]
+            )
+        ]
+        code = [
+            new
+            for item in code
+            for new in (
+                [i for i in expanded[id(item)] if isinstance(i, FunctionDef)]
+                if type(item) is tuple
+                else [item]
+            )
+        ]
+        return Program(decls + code)
+
+    def fail(self, msg: str, pos: int) -> NoReturn:
+        # events only keep token positions
+        self.error(msg, TokenStore.from_file(self.file_name)[pos])
+
     def parse_stub(self) -> StubDef:
         self.consume(PROCEDURE_DEFINITION)
         name = self.consume("ID").value
@@ -340,6 +658,11 @@ class Parser:
         self.consume_operator("}")
         return FunctionDef(name, ret_type, attributes, args, body)
 
+    def parse_bench(self) -> BenchDef:
+        self.consume(BENCH_BLOCK)
+        name = self.consume("STRING").value
+        return BenchDef(name, self.parse_block())
+
     def parse_arg(self) -> ArgDef:
         if self.current() and self.current().type == "ELLIPSIS":
             self.consume("ELLIPSIS")
@@ -355,7 +678,9 @@ class Parser:
     def parse_type(self) -> str:
         sourceT = self.current()
         base = self.consume("ID").value
-        if base not in GENERIC_TYPES and base not in TYPES:
+        if self.events is not None:
+            self.events.append(("use", base, self.pos - 1))
+        elif base not in GENERIC_TYPES and base not in TYPES:
             self.error(f"Unknown type '{base}'", sourceT)
 
         if (
@@ -406,6 +731,8 @@ class Parser:
             return self.parse_loop()
         elif token.type == LOOP_FOR:
             return self.parse_for()
+        elif token.type == "ATTR":
+            return self.parse_loop_attributes()
 
         if self.current().type == SELECTOR_STATEMENT:
             return self.parse_selector()
@@ -462,8 +789,8 @@ class Parser:
         return VarDecl(name, var_type, vattr, init_expr)
 
     def parse_selector(self) -> SelectorStmt:
-        self.consume(SELECTOR_STATEMENT)
-        target = self.consume("ID").value
+        keyword = self.consume(SELECTOR_STATEMENT)
+        target = self.parse_expr()
         self.consume(CONDITIONAL_IS)
         self.consume_operator("{")
         cases = []
@@ -488,6 +815,19 @@ class Parser:
             self.consume_operator("}")
         self.consume_operator("}")  # this closes off the selector
 
+        strings = [case.value.value for case in cases if isinstance(case.value, Str)]
+        if strings and len(strings) != len(cases):
+            self.error("case values must be all strings or no strings", keyword)
+        # "a" and "\x61" are the same string: compare what they hold
+        seen = {}
+        for string in strings:
+            held = string_bytes(string)
+            if held in seen:
+                self.error(
+                    f'case has the same string more than once: "{seen[held]}" and "{string}"',
+                    keyword,
+                )
+            seen[held] = string
         return SelectorStmt(target, cases, defaultBody)
 
     def parse_if(self, IF=CONDITIONAL_IF) -> IfStmt:
@@ -502,6 +842,52 @@ class Parser:
             false_body = self.parse_block()
         return IfStmt(condition, true_body, false_body)
 
+    def parse_loop_attributes(self) -> LoopStmt | ForStmt:
+        attributes, names = [], set()
+        while self.current() and self.current().type == "ATTR":
+            token = self.consume("ATTR")
+            name, paren, argument = token.value.partition("(")
+            if name not in LOOP_ATTRIBUTES:
+                self.error(f"{name} is not a loop attribute", token)
+            kind = LOOP_ATTRIBUTES[name]
+            argument = argument[:-1] if argument.endswith(")") else None
+            if kind is None and paren:
+                self.error(f"{name} takes no arguments", token)
+            if kind == "count" and not (argument and argument.isdigit()):
+                self.error(f"{name} takes a count, like {name}(4)", token)
+            if kind == "reductions" and paren and not self.reductions(argument):
+                self.error(
+                    f"{name} takes reductions, like {name}(+:total) or {name}(+:sum,max:top)",
+                    token,
+                )
+            attributes.append(token.value)
+            names.add(name)
+        if "@unroll" in names and names & OPENMP_ATTRIBUTES:
+            self.error("@unroll can't be used with @vectorize or @parallel", token)
+
+        token = self.current()
+        if token and token.type == LOOP_FOR:
+            loop = self.parse_for()
+        elif token and token.type == LOOP_WHILE:
+            loop = self.parse_loop()
+            for name in names & FOR_ONLY_ATTRIBUTES:
+                self.error(f"{name} only goes on for loops", token)
+        else:
+            self.error("attributes here have to be followed by for or while", token)
+        loop.attributes = attributes
+        return loop
+
+    @staticmethod
+    def reductions(argument: str | None) -> bool:
+        """Whether argument is a list of reductions like "+:sum,max:top"."""
+        if not argument:
+            return False
+        for reduction in argument.split(","):
+            op, colon, name = reduction.partition(":")
+            if op not in REDUCTION_OPERATORS or not colon or not name.isidentifier():
+                return False
+        return True
+
     def parse_loop(self) -> LoopStmt:
         self.consume(LOOP_WHILE)
         condition = self.parse_expr()
@@ -530,6 +916,7 @@ class Parser:
     def parse_struct(self) -> TypeDef:
         self.consume(DECLARE_TYPE)
         sourceName = self.current()
+        sourcePos = self.pos
         name = self.consume("ID").value
         fields = None
         if self.current() and self.current().value == "=":
@@ -560,7 +947,9 @@ class Parser:
                 fields.append((field_name, field_type, attrs))
             self.consume_operator("}")
 
-        if name in TYPES:
+        if self.events is not None:
+            self.events.append(("define", name, sourcePos))
+        elif name in TYPES:
             self.error(f"Type {name} already defined", sourceName)
         else:
             TYPES.add(name)
@@ -620,189 +1009,155 @@ class Parser:
                 self.consume("OP")
         return block
 
-    def parse_expr(self) -> object:
-        expr = self.parse_arith()
-        while (
-            self.current()
-            and self.current().type == "OP"
-            and self.current().value in {"==", "!=", ">", "<", ">=", "<=", "&&", "||"}
-        ):
-            op = self.consume("OP").value
-            right = self.parse_arith()
-            expr = BinOp(expr, op, right)
-        return expr
-
-    def parse_arith(self) -> object:
-        expr = self.parse_term()
-        while (
-            self.current()
-            and self.current().type == "OP"
-            and self.current().value in {"+", "-"}
-        ):
-            op = self.consume("OP").value
-            right = self.parse_term()
-            expr = BinOp(expr, op, right)
-        return expr
-
-    def parse_term(self) -> object:
+    def parse_expr(self, min_power: int = 1) -> object:
+        """
+        Precedence climbing over BINARY_PRECEDENCE: each operator only
+        recurses for its right operand, and only into tighter levels.
+        """
         expr = self.parse_factor()
-        while (
-            self.current()
-            and self.current().type == "OP"
-            and self.current().value in {"*", "/", "%"}
-        ):
-            op = self.consume("OP").value
-            right = self.parse_factor()
-            expr = BinOp(expr, op, right)
-        return expr
+        while True:
+            token = self.current()
+            if token is None or token.type != "OP":
+                return expr
+            power = BINARY_PRECEDENCE.get(token.value, 0)
+            if power < min_power:
+                return expr
+            self.pos += 1
+            expr = BinOp(expr, token.value, self.parse_expr(power + 1))
 
     def parse_factor(self) -> object:
+        # prefix operators ('&', '!', '-') are collected in a loop and wrap
+        # the operand afterwards, so '!!-x' doesn't recurse
         token = self.current()
+        prefix = []
+        while token and token.type == "OP" and token.value in PREFIX_OPERATORS:
+            prefix.append(token.value)
+            self.pos += 1
+            token = self.current()
+        atom = self.parse_atom()
+        for op in reversed(prefix):
+            atom = UnaryOp(op, atom)
+        return atom
 
-        # Handle unary operators like '&' and '!'
-        if token.type == "OP" and token.value in {"&", "!"}:
-            op = self.consume("OP")
-            operand = self.parse_factor()
-            return UnaryOp(op.value, operand)
-        if token.type == "NEG_ID":
-            self.consume("NEG_ID")
-            atom = UnaryOp(
-                "-", Var(token.value[1:])
-            )  # strip the '-', wrap in unary negation
-        elif token.type == "NUMBER":
-            self.consume("NUMBER")
-            atom = Num(token.value)
-        elif token.type == "STRING":
-            self.consume("STRING")
-            atom = Str(token.value)
-        elif token.type == "CHAR":
-            self.consume("CHAR")
-            atom = Char(token.value)
-        elif token.type in (BOOLEAN_TRUE, BOOLEAN_FALSE):
-            t = self.consume(token.type)
-            atom = Bool(t.value)
-        elif token.type == "OP" and token.value == "{":
-            atom = self.parse_object_literal()
-        elif token.type == "ID":
-            id_token = self.consume("ID")
-            if (
-                id_token.value == "ptr"
-                and self.current()
-                and self.current().type == "OP"
-                and self.current().value == "<"
-            ):
-                self.consume_operator("<")
-                type_id = self.parse_type()
-                self.consume_operator(">")
-                self.consume_operator("(")
-                expr = self.parse_expr()
-                self.consume_operator(")")
-                atom = PCast(type_id, expr)
-            elif (
-                id_token.value == "struct"
-                and self.current()
-                and self.current().type == "OP"
-                and self.current().value == "<"
-            ):
-                self.consume_operator("<")
-                type_id = self.parse_type()
-                self.consume_operator(">")
-                atom = StructVar(type_id)
-            elif (
-                id_token.value == "Raw"
-                and self.current()
-                and self.current().type == "OP"
-                and self.current().value == "<"
-            ):
-                self.consume_operator("<")
-                expr = self.consume("ID").value
-                self.consume_operator(">")
-                atom = Deref(expr)
-            elif (
-                id_token.value == "Cast"
-                and self.current()
-                and self.current().type == "OP"
-                and self.current().value == "<"
-            ):
-                self.consume_operator("<")
-                type_id = self.parse_type()
-                self.consume_operator(">")
-                if self.current().value == "{":
-                    expr = self.parse_expr()
-                    atom = Cast(type_id, expr)
-                else:
-                    self.consume_operator("(")
-                    expr = self.parse_expr()
-                    self.consume_operator(")")
-                    atom = Cast(type_id, expr)
-            elif (
-                id_token.value == "Array"
-                and self.current()
-                and self.current().type == "OP"
-                and self.current().value == "<"
-            ):
-                self.consume_operator("<")
-                array_type = self.parse_type()
-                if not self.consume("OP").value == ",":
-                    ParserError('arrays expect a type and size, separated by ","')
-                array_size = self.consume()
-                if not array_size.type in ["ID", "NUMBER"]:
-                    ParserError("arrays expect size to be a variable or a number")
-                self.consume_operator(">")
-                atom = Array(array_type, array_size.value)
-            elif (
-                self.current()
-                and self.current().type == "OP"
-                and self.current().value == "("
-            ):
-                self.consume_operator("(")
+    def parse_atom(self) -> object:
+        token = self.current()
+        if token is None:
+            self.error("Unexpected end of input", token)
+
+        kind = token.type
+        # identifiers and numbers first: they are most of the operands
+        if kind == "ID":
+            self.pos += 1
+            following = self.current()
+            if following is None or following.type != "OP":
+                atom = Var(token.value)
+            elif following.value == "(":
+                self.pos += 1
                 args = []
-                if self.current() and not (
-                    self.current().type == "OP" and self.current().value == ")"
+                following = self.current()
+                if following and not (
+                    following.type == "OP" and following.value == ")"
                 ):
                     args.append(self.parse_expr())
+                    following = self.current()
                     while (
-                        self.current()
-                        and self.current().type == "OP"
-                        and self.current().value == ","
+                        following
+                        and following.type == "OP"
+                        and following.value == ","
                     ):
-                        self.consume_operator(",")
+                        self.pos += 1
                         args.append(self.parse_expr())
+                        following = self.current()
                 self.consume_operator(")")
-                atom = FuncCall(id_token.value, args)
+                atom = FuncCall(token.value, args)
+            elif following.value == "<" and token.value in GENERIC_FORMS:
+                atom = self.parse_generic(token.value)
             else:
-                atom = Var(id_token.value)
-        elif token.type == "OP" and token.value == "(":
-            self.consume_operator("(")
+                atom = Var(token.value)
+        elif kind == "NUMBER":
+            self.pos += 1
+            atom = Num(token.value)
+        elif kind == "STRING":
+            self.pos += 1
+            atom = Str(token.value)
+        elif kind == "CHAR":
+            self.pos += 1
+            atom = Char(token.value)
+        elif kind in (BOOLEAN_TRUE, BOOLEAN_FALSE):
+            self.pos += 1
+            atom = Bool(token.value)
+        elif kind == "OP" and token.value == "(":
+            self.pos += 1
             atom = self.parse_expr()
             self.consume_operator(")")
-        elif token.type == PP_DIRECTIVE:
+        elif kind == "OP" and token.value == "{":
+            atom = self.parse_object_literal()
+        elif kind == PP_DIRECTIVE:
             atom = self.parse_preprocessor_directive()
-
+        elif kind == "NEG_ID":
+            self.consume("NEG_ID")
+            atom = UnaryOp(
+                "-", Var(token.value[1:])
+            )  # strip the '-', wrap in unary negation
         else:
             self.error(f"Unexpected token '{token.type}'", token)
 
         # Postfix: member and index access.
-        while (
-            self.current()
-            and self.current().type == "OP"
-            and self.current().value in {".", ":", "["}
-        ):
-            if self.current().value == ".":
-                self.consume_operator(".")
+        token = self.current()
+        while token and token.type == "OP" and token.value in POSTFIX_OPERATORS:
+            self.pos += 1
+            if token.value == ".":
                 member = self.consume_member_name()
                 atom = MemberAccess(atom, member)
-            elif self.current().value == ":":
-                self.consume_operator(":")
+            elif token.value == ":":
                 attribute = self.consume_member_name()
                 atom = AttributeAccess(atom, attribute)
-            elif self.current().value == "[":
-                self.consume_operator("[")
+            else:
                 index_expr = self.parse_expr()
                 self.consume_operator("]")
                 atom = IndexAccess(atom, index_expr)
+            token = self.current()
         return atom
 
+    def parse_generic(self, name: str) -> object:
+        """ptr<T>(e), struct<T>, Raw<name>, Cast<T>(e) and Array<T, n>"""
+        self.consume_operator("<")
+        if name == "ptr":
+            type_id = self.parse_type()
+            self.consume_operator(">")
+            self.consume_operator("(")
+            expr = self.parse_expr()
+            self.consume_operator(")")
+            return PCast(type_id, expr)
+        elif name == "struct":
+            type_id = self.parse_type()
+            self.consume_operator(">")
+            return StructVar(type_id)
+        elif name == "Raw":
+            expr = self.consume("ID").value
+            self.consume_operator(">")
+            return Deref(expr)
+        elif name == "Cast":
+            type_id = self.parse_type()
+            self.consume_operator(">")
+            if self.current().value == "{":
+                expr = self.parse_expr()
+                return Cast(type_id, expr)
+            else:
+                self.consume_operator("(")
+                expr = self.parse_expr()
+                self.consume_operator(")")
+                return Cast(type_id, expr)
+        else:
+            array_type = self.parse_type()
+            if not self.consume("OP").value == ",":
+                ParserError('arrays expect a type and size, separated by ","')
+            array_size = self.consume()
+            if not array_size.type in ["ID", "NUMBER"]:
+                ParserError("arrays expect size to be a variable or a number")
+            self.consume_operator(">")
+            return Array(array_type, array_size.value)
+
     def parse_object_literal(self) -> StructLiteral:
         self.consume_operator("{")
         fields = []
@@ -856,15 +1211,200 @@ class Parser:
         return StructLiteral(fields)
 
 
+# --- parallel front end ---
+def parse_deferred(
+    file_name: str, platform: str, engine: str
+) -> tuple[list[str], str | None, bytes] | None:
+    """
+    Worker side of the parallel front end: parse one module without the
+    shared state. Imports stay markers and type checks become events, which
+    Parser.replay() runs in order in the main process. None means the module
+    doesn't parse, and the serial parse will report why.
+    """
+    import pickle
+
+    global currentPlatform
+    currentPlatform = platform
+    tokenizer.ENGINE = engine
+    digest = cache.file_digest(file_name)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            tokens = TokenStore.from_file(file_name)
+            parser = Parser(tokens, None, os.path.dirname(file_name), file_name)
+            parser.events = []
+            parser.parse()
+    except (SystemExit, Exception):
+        return None
+    decls, code = parser.deferred
+    imports = [event[1].value for event in parser.events if event[0] == "import"]
+    # pickled here so the main process can load it with the collector paused
+    payload = pickle.dumps(
+        {"decls": decls, "code": code, "events": parser.events},
+        pickle.HIGHEST_PROTOCOL,
+    )
+    return imports, digest, payload
+
+
+def _load_paused(payload: bytes) -> dict:
+    # a module's AST is enough new containers at once to set off several
+    # full collections, which cost more than parsing the module did
+    import pickle
+
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return pickle.loads(payload)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+_IMPORT_STATEMENT = re.compile(rb"\b" + IMPORT_FILE.encode() + rb"\b")
+
+
+class Preparser:
+    """
+    Parses the modules reachable from the entry file on a process pool, so
+    import_module() can replay worker results instead of parsing each module
+    in turn. Workers report the imports they find, and those get submitted
+    as soon as they are known. The pool only starts at the first module that
+    misses the cache, so warm builds never pay for it.
+    """
+
+    def __init__(self, roots: list[str], jobs: int) -> None:
+        self.roots = roots
+        self.jobs = jobs
+        self.pool: "ProcessPoolExecutor | None" = None
+        self.futures: "dict[str, Future]" = {}
+        self.finished = False
+        self.changed = threading.Condition()
+
+    def _submit(self, names: list[str], pending: set) -> None:
+        for name in names:
+            path = resolver.resolve(name + ".neon")
+            if path is None or path in self.futures or path in filesIncluded:
+                continue
+            future = self.pool.submit(
+                parse_deferred, path, currentPlatform, tokenizer.ENGINE
+            )
+            pending.add(future)
+            with self.changed:
+                self.futures[path] = future
+                self.changed.notify_all()
+
+    def _start(self) -> None:
+        # only -j builds with modules to parse pay for multiprocessing
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # forking is cheap but only safe while this is the only thread (in
+        # the daemon it may not be): a thread holding a lock at the fork
+        # leaves it held in the child for good
+        methods = multiprocessing.get_all_start_methods()
+        if threading.active_count() == 1 and "fork" in methods:
+            method = "fork"
+        else:
+            method = "forkserver" if "forkserver" in methods else "spawn"
+        context = multiprocessing.get_context(method)
+        if method == "forkserver":
+            context.set_forkserver_preload(["neon"])
+        self.pool = ProcessPoolExecutor(self.jobs, mp_context=context)
+        # the first submit starts the workers (every one of them, with
+        # fork), so it happens here, before the discovery thread exists
+        pending = set()
+        self._submit(self.roots, pending)
+        threading.Thread(target=self._discover, args=(pending,), daemon=True).start()
+
+    def _discover(self, pending: set) -> None:
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if not future.cancelled() and future.exception() is None:
+                        result = future.result()
+                        if result is not None:
+                            self._submit(result[0], pending)
+        except RuntimeError:
+            pass  # close() shut the pool down under us
+        finally:
+            with self.changed:
+                self.finished = True
+                self.changed.notify_all()
+
+    def get(self, file_name: str) -> dict | None:
+        """The worker's parse of file_name, or None to parse it serially."""
+        if self.pool is None:
+            if not self._worth_a_pool(file_name):
+                return None
+            self._start()
+        with self.changed:
+            while file_name not in self.futures and not self.finished:
+                self.changed.wait()
+            future = self.futures.get(file_name)
+        if future is None:
+            return None
+        try:
+            result = future.result()
+        except Exception:
+            return None
+        if result is None or result[1] != cache.file_digest(file_name):
+            return None
+        return _load_paused(result[2])
+
+    def _worth_a_pool(self, file_name: str) -> bool:
+        """
+        False when file_name, the module that missed the cache, is all that
+        is left to parse: it imports nothing and every other root is done.
+        """
+        try:
+            with open(file_name, "rb") as f:
+                if _IMPORT_STATEMENT.search(f.read()):
+                    return True
+        except OSError:
+            return False
+        for name in self.roots:
+            path = resolver.resolve(name + ".neon")
+            if path is not None and path != file_name and path not in filesIncluded:
+                return True
+        return False
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+_preparser: Preparser | None = None
+
+
+def parallel_imports(entry: TokenStore, jobs: int) -> None:
+    """Parse the modules entry imports on up to jobs worker processes."""
+    global _preparser
+    stop_parallel_imports()
+    roots = [
+        entry.value(i + 1)
+        for i in range(len(entry) - 1)
+        if entry.type(i) == IMPORT_FILE and entry.type(i + 1) == "STRING"
+    ]
+    if roots and jobs > 1:
+        _preparser = Preparser(roots, jobs)
+
+
+def stop_parallel_imports() -> None:
+    global _preparser
+    if _preparser is not None:
+        _preparser.close()
+        _preparser = None
+
+
 def main():
     if len(sys.argv) < 2:
         print("Usage: neon.py <input-file>")
         sys.exit(1)
     input_file = sys.argv[1]
-    with open(input_file, "r") as f:
-        code = f.read()
-    tokens = tokenize(code, input_file)
-    parser = Parser(tokens, code, os.path.dirname(input_file), input_file)
+    tokens = TokenStore.from_file(input_file)
+    parser = Parser(tokens, None, os.path.dirname(input_file), input_file)
     ast = parser.parse()
     import pprint
 
@@ -20,17 +20,17 @@ class ParserError:
 
 
 # --- AST Node Definitions ---
-@dataclass
+@dataclass(slots=True)
 class Program:
     items: List[object]
 
 
-@dataclass
+@dataclass(slots=True)
 class PreprocessorDirective:
     directive: str
 
 
-@dataclass
+@dataclass(slots=True)
 class FunctionDef:
     name: str
     ret_type: str
@@ -39,7 +39,14 @@ class FunctionDef:
     body: List[object] = field(default_factory=list)
 
 
-@dataclass
+# bench "name" { ... }, built only by `neon2c bench`
+@dataclass(slots=True)
+class BenchDef:
+    name: str
+    body: List[object] = field(default_factory=list)
+
+
+@dataclass(slots=True)
 class StubDef:
     name: str
     ret_type: str
@@ -47,14 +54,14 @@ class StubDef:
     args: List["ArgDef"] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class ArgDef:
     name: str
     arg_type: str
     variadic: bool = False
 
 
-@dataclass
+@dataclass(slots=True)
 class VarDecl:
     name: str
     var_type: str | None
@@ -62,7 +69,7 @@ class VarDecl:
     init_expr: Optional[object] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class ConstDecl:
     name: str
     const_type: str
@@ -70,61 +77,63 @@ class ConstDecl:
     init_expr: Optional[object] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Assignment:
     target: object
     expr: object
     op: str = "="
 
 
-@dataclass
+@dataclass(slots=True)
 class ReturnStmt:
     expr: object | None
 
 
-@dataclass
+@dataclass(slots=True)
 class ExprStmt:
     expr: object
 
 
-@dataclass
+@dataclass(slots=True)
 class BinOp:
     left: object
     op: str
     right: object
 
 
-@dataclass
+@dataclass(slots=True)
 class SelectorStmt:
-    target: str
+    target: object
     cases: List[object]
     default: object
 
 
-@dataclass
+@dataclass(slots=True)
 class CaseStmt:
     value: str
     body: List[object]
 
 
-@dataclass
+@dataclass(slots=True)
 class UnaryOp:
     op: str
     operand: object
 
 
-@dataclass
+@dataclass(slots=True)
 class Num:
     value: Union[int, float]
 
-    def __init__(self, value: str):
-        if value.startswith("0x"):
+    def __init__(self, value: str | int | float):
+        if not isinstance(value, str):
+            self.value = value
+        elif value.startswith("0x"):
             self.value = int(value, 16)
         else:
             self.value = float(value) if "." in value else int(value)
 
 
-@dataclass
+@dataclass(slots=True)
 class Str:
     value: str
 
@@ -132,7 +141,7 @@ class Str:
         self.value = value
 
 
-@dataclass
+@dataclass(slots=True)
 class Char:
     value: str
 
@@ -140,7 +149,7 @@ class Char:
         self.value = value
 
 
-@dataclass
+@dataclass(slots=True)
 class Bool:
     value: bool
 
@@ -148,108 +157,118 @@ class Bool:
         self.value = value == "true"
 
 
-@dataclass
+@dataclass(slots=True)
 class Var:
     name: str
 
 
-@dataclass
+@dataclass(slots=True)
 class MemberAccess:
     obj: object
     member: str
 
 
-@dataclass
+@dataclass(slots=True)
 class AttributeAccess:
     obj: object
     attribute: str
 
 
-@dataclass
+@dataclass(slots=True)
 class IndexAccess:
     obj: object
     index: object
 
 
-@dataclass
+@dataclass(slots=True)
 class FuncCall:
     func_name: str
     args: List[object]
 
 
-@dataclass
+@dataclass(slots=True)
 class Include:
     header: str
 
 
-@dataclass
+@dataclass(slots=True)
 class TypeDef:
     name: str
     fields: Optional[List[Tuple[str, str]]]
 
 
-@dataclass
+@dataclass(slots=True)
 class EnumDef:
     name: str
     fields: List[Tuple[str, int]]
 
 
-@dataclass
+@dataclass(slots=True)
 class IfStmt:
     condition: object
     true_body: List[object]
     false_body: List[object] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class LoopStmt:
     condition: object
     body: List[object]
+    attributes: List[str] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class ForStmt:
     init: object  # e.g., var i int = 0
     condition: object  # e.g., i < 10
     update: object  # e.g., i = i + 1
     body: List[object]
+    attributes: List[str] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class StructLiteral:
     fields: List[Tuple[Optional[str], object]]
 
 
-@dataclass
+@dataclass(slots=True)
 class Define:
     name: str
     value: object
 
 
 # New AST nodes for casting
-@dataclass
+@dataclass(slots=True)
 class Cast:
     type_name: str
     expr: object
 
 
-@dataclass
+@dataclass(slots=True)
 class PCast:
     type_name: str
     expr: object
 
 
-@dataclass
+@dataclass(slots=True)
 class StructVar:  # like "struct sockaddr_in addr" "var addr struct<sockaddr_in>"
     type_name: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Deref:
     expr: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Array:
     array_type: str
     array_size: int | None | str
+
+
+# made by the optimizer (for inlined functions), never by the parser
+@dataclass(slots=True)
+class Conditional:
+    condition: object
+    then: object
+    otherwise: object
@@ -0,0 +1,792 @@
+"""
+AST optimizations for `neon2c -O`.
+
+Runs between Parser.parse and code generation. -O1 folds constant integer,
+float and boolean arithmetic and comparisons, substitutes `define`s and
+int `const`s whose values are constant, simplifies identities (x + 0,
+x * 1, 0 && x, ...) and prunes `if`/`while` whose condition is constant.
+-O2 also inlines small functions that come down to one expression (and
+any marked @inline or @always_inline) at their call sites.
+shake() then drops the functions, prototypes, types and globals `main`
+can't reach, so imports like stdlib.neon only cost what is used.
+
+Nodes are never changed in place: parsed modules are shared with the
+module cache and with codegen's memo, so the optimizer builds new nodes
+for what it changes and hands back the originals for everything else.
+"""
+
+import math
+import re
+from dataclasses import dataclass
+from nodes import *
+
+# integer literals and the arithmetic on them are C ints; anything that
+# could overflow one (or wasn't an int to begin with) is left to cc
+INT_MIN = -(2**31)
+INT_MAX = 2**31 - 1
+
+# top-level consts of these types are substituted like defines. float and
+# double consts aren't: the literal would be a double where the const isn't
+CONSTANT_TYPES = {"int"}
+
+COMPARISONS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    ">": lambda a, b: a > b,
+    "<=": lambda a, b: a <= b,
+    ">=": lambda a, b: a >= b,
+}
+
+# functions are only inlined if every parameter and the result is one of
+# these, so casting an argument gives it exactly the value the call would
+SCALAR_TYPES = {
+    "int",
+    "uint",
+    "number",
+    "char",
+    "uchar",
+    "ulong",
+    "float",
+    "double",
+    "boolean",
+}
+
+# -O2 inlines any function whose expression is at most this many nodes
+INLINE_LIMIT = 16
+# arguments a function uses more than once are copied, so only small ones
+COPY_LIMIT = 4
+# inlined bodies may call functions that get inlined in turn, up to here
+INLINE_DEPTH = 4
+
+IDENTIFIER = re.compile(r"[A-Za-z_]\w*")
+
+# results of earlier runs, by top-level item identity, so a daemon or
+# `watch` hands codegen the same optimized nodes (and gets its memoized C
+# back) for modules that didn't change: id -> (item, key, result)
+_memo: dict[int, tuple[object, tuple, object]] = {}
+# what the functions inlined into those results were
+_memo_inlines: dict = {}
+
+
+def constant(node: object) -> int | float | None:
+    """The value of a literal number or boolean, else None."""
+    kind = type(node)
+    if kind is Num:
+        return node.value
+    if kind is Bool:
+        return int(node.value)
+    return None
+
+
+def is_int(value: object) -> bool:
+    return type(value) is int and INT_MIN <= value <= INT_MAX
+
+
+def int_literal(value: int) -> int | None:
+    """
+    value, if it can be written as an int literal: -2147483648 is - applied
+    to a long, so INT_MIN is left to cc.
+    """
+    return value if is_int(value) and value != INT_MIN else None
+
+
+def _divide(a: int, b: int) -> int:
+    # C truncates toward zero, Python's // floors
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+
+def fold_binary(op: str, a: int | float, b: int | float) -> int | float | None:
+    """a op b as C would compute it, or None when it shouldn't be folded."""
+    if op in COMPARISONS:
+        return int(COMPARISONS[op](a, b))
+    if op == "&&":
+        return int(bool(a) and bool(b))
+    if op == "||":
+        return int(bool(a) or bool(b))
+
+    if type(a) is int and type(b) is int:
+        if not (is_int(a) and is_int(b)):
+            return None
+        if op == "+":
+            result = a + b
+        elif op == "-":
+            result = a - b
+        elif op == "*":
+            result = a * b
+        elif op == "/" and b:
+            result = _divide(a, b)
+        elif op == "%" and b:
+            result = a - b * _divide(a, b)
+        elif op == "&":
+            result = a & b
+        elif op == "|":
+            result = a | b
+        else:
+            return None
+        return int_literal(result)
+
+    if op == "+":
+        result = a + b
+    elif op == "-":
+        result = a - b
+    elif op == "*":
+        result = a * b
+    elif op == "/" and b:
+        result = a / b
+    else:
+        return None  # % and the bitwise operators don't take floats
+    return result if math.isfinite(result) else None
+
+
+def fold_unary(op: str, a: int | float) -> int | float | None:
+    if op == "!":
+        return int(not a)
+    if op == "-":
+        if type(a) is int:
+            return -a if is_int(a) and is_int(-a) else None
+        return -a
+    return None
+
+
+def simplify(left: object, op: str, right: object) -> object | None:
+    """
+    An operand that x op c or c op x reduces to without evaluating
+    anything twice or dropping side effects, else None.
+    """
+    a, b = constant(left), constant(right)
+    if op == "&&" and a is not None and not a:
+        return Num(0)
+    if op == "||" and a is not None and a:
+        return Num(1)
+    # only int identities: x + 0.0 would turn an int x into a double
+    if type(b) is int:
+        if b == 0 and op in ("+", "-"):
+            return left
+        if b == 1 and op in ("*", "/"):
+            return left
+    if type(a) is int:
+        if a == 0 and op == "+":
+            return right
+        if a == 1 and op == "*":
+            return right
+    return None
+
+
+def fold_cast(type_name: str, value: int | float) -> int | float | None:
+    if type_name == "int":
+        if not math.isfinite(value):
+            return None
+        return int_literal(int(value))  # C truncates toward zero too
+    if type_name == "double":
+        return float(value)
+    # not float: its literal would be a double, and arithmetic on it would
+    # then be done in double where C does it in float
+    return None
+
+
+def size(node: object) -> int:
+    """How many nodes an expression is made of."""
+    total = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        kind = type(node)
+        if kind is list or kind is tuple:
+            stack.extend(node)
+        elif hasattr(kind, "__slots__"):
+            total += 1
+            stack.extend(getattr(node, slot) for slot in kind.__slots__)
+    return total
+
+
+def pure(node: object) -> bool:
+    """False if evaluating node could call something or run raw C."""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        kind = type(node)
+        if kind is FuncCall or kind is PreprocessorDirective:
+            return False
+        if kind is list or kind is tuple:
+            stack.extend(node)
+        elif hasattr(kind, "__slots__"):
+            stack.extend(getattr(node, slot) for slot in kind.__slots__)
+    return True
+
+
+def substitute(node: object, values: dict[str, object]) -> object:
+    """node with each Var named in values replaced."""
+    kind = type(node)
+    if kind is Var:
+        return values.get(node.name, node)
+    if kind is list:
+        return [substitute(child, values) for child in node]
+    if kind is tuple:
+        return tuple(substitute(child, values) for child in node)
+    if kind in (Num, Str, Char, Bool) or not hasattr(kind, "__slots__"):
+        return node
+    return kind(*(substitute(getattr(node, slot), values) for slot in kind.__slots__))
+
+
+def as_expression(body: list) -> object | None:
+    """
+    The single expression a function body returns, if it is nothing but
+    ifs and returns: `if a > b {return a} return b` is (a > b ? a : b).
+    """
+    if not body:
+        return None
+    first, rest = body[0], body[1:]
+    if type(first) is ReturnStmt:
+        return first.expr
+    if type(first) is IfStmt:
+        then = as_expression(first.true_body + rest)
+        otherwise = as_expression(first.false_body + rest)
+        if then is not None and otherwise is not None:
+            return Conditional(first.condition, then, otherwise)
+    return None
+
+
+@dataclass(slots=True)
+class Inlinable:
+    params: list[ArgDef]
+    ret_type: str
+    expr: object
+    # how often the expression uses each parameter
+    uses: dict[str, int]
+    # every other name it mentions, which a caller mustn't have declared
+    free: set[str]
+
+
+def inlinable(proc: FunctionDef, level: int) -> Inlinable | None:
+    forced = "@inline" in proc.attributes or "@always_inline" in proc.attributes
+    if level < 2 or "@extern" in proc.attributes:
+        return None
+    if proc.ret_type not in SCALAR_TYPES:
+        return None
+    if any(arg.variadic or arg.arg_type not in SCALAR_TYPES for arg in proc.args):
+        return None
+    expr = as_expression(proc.body)
+    if expr is None or not forced and size(expr) > INLINE_LIMIT:
+        return None
+
+    uses = {arg.name: 0 for arg in proc.args}
+    stack = [expr]
+    while stack:
+        node = stack.pop()
+        kind = type(node)
+        if kind is Var and node.name in uses:
+            uses[node.name] += 1
+        elif kind is UnaryOp and node.op == "&" or kind is PreprocessorDirective:
+            return None  # a parameter's address, or C we can't see into
+        elif hasattr(kind, "__slots__"):
+            stack.extend(getattr(node, slot) for slot in kind.__slots__)
+        elif kind is list or kind is tuple:
+            stack.extend(node)
+    free = references(expr) - uses.keys()
+    if proc.name in free:
+        return None  # recursive
+    return Inlinable(proc.args, proc.ret_type, expr, uses, free)
+
+
+def declares(body: list) -> bool:
+    return any(type(stmt) in (VarDecl, ConstDecl) for stmt in body)
+
+
+def declared_names(body: list, names: set) -> set:
+    """Every name a function body declares, in any nested block."""
+    for stmt in body:
+        kind = type(stmt)
+        if kind in (VarDecl, ConstDecl):
+            names.add(stmt.name)
+        elif kind is IfStmt:
+            declared_names(stmt.true_body, names)
+            declared_names(stmt.false_body, names)
+        elif kind is LoopStmt:
+            declared_names(stmt.body, names)
+        elif kind is ForStmt:
+            declared_names([stmt.init, stmt.update], names)
+            declared_names(stmt.body, names)
+        elif kind is SelectorStmt:
+            for case in stmt.cases:
+                declared_names(case.body, names)
+            declared_names(stmt.default, names)
+    return names
+
+
+class Optimizer:
+    """
+    Optimizes a program's top-level items in order, since a define or const
+    only applies to what comes after it. items() then maps any subset of
+    those items (a module, for --split) to the same optimized nodes.
+    """
+
+    def __init__(self, level: int) -> None:
+        self.level = level
+        # define/const name -> its folded value, as a Num
+        self.constants: dict[str, Num] = {}
+        self.signature: tuple = ()
+        # names a function declares itself, which hide constants
+        self.shadowed: set[str] = set()
+        self.done: dict[int, object] = {}
+        # #if nesting depth of the top-level directives seen so far
+        self.conditional = 0
+        # function name -> how to inline it
+        self.inlines: dict[str, Inlinable] = {}
+        self.inline_depth = 0
+
+        self.expressions = {
+            BinOp: self.binop,
+            UnaryOp: self.unary,
+            Var: self.var,
+            MemberAccess: self.member_access,
+            AttributeAccess: self.attribute_access,
+            IndexAccess: self.index_access,
+            FuncCall: self.call,
+            StructLiteral: self.struct_literal,
+            Cast: self.cast,
+            PCast: self.cast,
+            Conditional: self.conditional_expr,
+        }
+        self.statements = {
+            VarDecl: self.var_decl,
+            ConstDecl: self.const_decl,
+            Assignment: self.assignment,
+            ReturnStmt: self.return_stmt,
+            ExprStmt: self.expr_stmt,
+            IfStmt: self.if_stmt,
+            LoopStmt: self.loop,
+            ForStmt: self.for_stmt,
+            SelectorStmt: self.selector,
+        }
+
+    # --- top level ---
+    def program(self, items: list) -> list:
+        for item in items:
+            if type(item) is FunctionDef:
+                inline = inlinable(item, self.level)
+                if inline is not None:
+                    self.inlines[item.name] = inline
+        # a result that inlined a function is stale once the function changes
+        global _memo_inlines
+        if _memo_inlines != self.inlines:
+            _memo.clear()
+            _memo_inlines = self.inlines
+
+        out = []
+        for item in items:
+            key = (self.level, self.signature)
+            known = _memo.get(id(item))
+            if known is not None and known[0] is item and known[1] == key:
+                new = known[2]
+                self.learn(new)
+            else:
+                new = self.top_level(item)
+                _memo[id(item)] = (item, key, new)
+            self.done[id(item)] = new
+            out.append(new)
+        for stale in _memo.keys() - self.done.keys():
+            del _memo[stale]
+        return out
+
+    def items(self, items: list) -> list:
+        """The optimized version of items, which program() has seen."""
+        return [self.done.get(id(item), item) for item in items]
+
+    def top_level(self, item: object) -> object:
+        kind = type(item)
+        if kind is FunctionDef:
+            new = self.function(item)
+        elif kind is Define:
+            value = self.expr(item.value)
+            new = item if value is item.value else Define(item.name, value)
+        elif kind in (VarDecl, ConstDecl):
+            new = self.statements[kind](item)
+        else:
+            new = item
+        self.learn(new)
+        return new
+
+    def learn(self, item: object) -> None:
+        """Remember the constant an optimized top-level item defines."""
+        kind = type(item)
+        if kind is PreprocessorDirective:
+            self.directive(item.directive)
+            return
+        if self.conditional:
+            return  # it might not be compiled in
+        if kind is Define:
+            value = item.value
+        elif kind is ConstDecl and item.const_type in CONSTANT_TYPES:
+            value = item.init_expr
+            if type(value) is Num:
+                # what the const holds is its initializer converted to its type
+                folded = fold_cast(item.const_type, value.value)
+                value = None if folded is None else Num(folded)
+        else:
+            return
+        if type(value) is Num and (type(value.value) is float or is_int(value.value)):
+            self.set_constant(item.name, value)
+        elif item.name in self.constants:
+            self.set_constant(item.name, None)
+
+    def directive(self, text: str) -> None:
+        words = text.lstrip("#").split()
+        if not words:
+            return
+        if words[0] in ("if", "ifdef", "ifndef"):
+            self.conditional += 1
+        elif words[0] == "endif":
+            self.conditional = max(0, self.conditional - 1)
+        elif words[0] in ("undef", "define") and len(words) > 1:
+            self.set_constant(words[1].split("(")[0], None)
+
+    def set_constant(self, name: str, value: Num | None) -> None:
+        if value is None:
+            self.constants.pop(name, None)
+        else:
+            self.constants[name] = value
+        self.signature = tuple(
+            (name, type(num.value), num.value) for name, num in self.constants.items()
+        )
+
+    def function(self, proc: FunctionDef) -> FunctionDef:
+        self.shadowed = declared_names(proc.body, {arg.name for arg in proc.args})
+        try:
+            body = self.block(proc.body)
+        finally:
+            self.shadowed = set()
+        if body is proc.body:
+            return proc
+        return FunctionDef(proc.name, proc.ret_type, proc.attributes, proc.args, body)
+
+    # --- statements ---
+    def block(self, body: list) -> list:
+        out = []
+        changed = False
+        for stmt in body:
+            handler = self.statements.get(type(stmt))
+            new = handler(stmt) if handler else stmt
+            if type(new) is list:
+                out.extend(new)
+                changed = True
+            else:
+                out.append(new)
+                changed |= new is not stmt
+        return out if changed else body
+
+    def statement(self, stmt: object) -> object:
+        """A statement that has to stay a single statement (for's init/update)."""
+        handler = self.statements.get(type(stmt))
+        new = handler(stmt) if handler else stmt
+        return stmt if type(new) is list else new
+
+    def var_decl(self, stmt: VarDecl) -> VarDecl:
+        init = self.expr(stmt.init_expr)
+        if init is stmt.init_expr:
+            return stmt
+        return VarDecl(stmt.name, stmt.var_type, stmt.var_attr, init)
+
+    def const_decl(self, stmt: ConstDecl) -> ConstDecl:
+        init = self.expr(stmt.init_expr)
+        if init is stmt.init_expr:
+            return stmt
+        return ConstDecl(stmt.name, stmt.const_type, stmt.const_attr, init)
+
+    def assignment(self, stmt: Assignment) -> Assignment:
+        target, expr = self.expr(stmt.target), self.expr(stmt.expr)
+        if target is stmt.target and expr is stmt.expr:
+            return stmt
+        return Assignment(target, expr, stmt.op)
+
+    def return_stmt(self, stmt: ReturnStmt) -> ReturnStmt:
+        expr = self.expr(stmt.expr)
+        return stmt if expr is stmt.expr else ReturnStmt(expr)
+
+    def expr_stmt(self, stmt: ExprStmt) -> ExprStmt:
+        expr = self.expr(stmt.expr)
+        return stmt if expr is stmt.expr else ExprStmt(expr)
+
+    def if_stmt(self, stmt: IfStmt) -> object:
+        condition = self.expr(stmt.condition)
+        value = constant(condition)
+        if value is not None:
+            taken = self.block(stmt.true_body if value else stmt.false_body)
+            # a block's declarations are scoped to it, so it can only be
+            # spliced into the enclosing one without them
+            if declares(taken):
+                return IfStmt(Num(1), taken, [])
+            return taken
+        true_body = self.block(stmt.true_body)
+        false_body = self.block(stmt.false_body)
+        if (
+            condition is stmt.condition
+            and true_body is stmt.true_body
+            and false_body is stmt.false_body
+        ):
+            return stmt
+        return IfStmt(condition, true_body, false_body)
+
+    def loop(self, stmt: LoopStmt) -> object:
+        condition = self.expr(stmt.condition)
+        value = constant(condition)
+        if value is not None and not value:
+            return []
+        body = self.block(stmt.body)
+        if condition is stmt.condition and body is stmt.body:
+            return stmt
+        return LoopStmt(condition, body, stmt.attributes)
+
+    def for_stmt(self, stmt: ForStmt) -> ForStmt:
+        init = self.statement(stmt.init)
+        condition = self.expr(stmt.condition)
+        update = self.statement(stmt.update)
+        body = self.block(stmt.body)
+        if (
+            init is stmt.init
+            and condition is stmt.condition
+            and update is stmt.update
+            and body is stmt.body
+        ):
+            return stmt
+        return ForStmt(init, condition, update, body, stmt.attributes)
+
+    def selector(self, stmt: SelectorStmt) -> SelectorStmt:
+        cases = []
+        for case in stmt.cases:
+            value, body = self.expr(case.value), self.block(case.body)
+            if value is case.value and body is case.body:
+                cases.append(case)
+            else:
+                cases.append(CaseStmt(value, body))
+        target, default = self.expr(stmt.target), self.block(stmt.default)
+        if (
+            target is stmt.target
+            and default is stmt.default
+            and all(new is old for new, old in zip(cases, stmt.cases))
+        ):
+            return stmt
+        return SelectorStmt(target, cases, default)
+
+    # --- expressions ---
+    def expr(self, expr: object) -> object:
+        handler = self.expressions.get(type(expr))
+        return handler(expr) if handler else expr
+
+    def binop(self, expr: BinOp) -> object:
+        left, right = self.expr(expr.left), self.expr(expr.right)
+        a, b = constant(left), constant(right)
+        if a is not None and b is not None:
+            value = fold_binary(expr.op, a, b)
+            if value is not None:
+                return Num(value)
+        simpler = simplify(left, expr.op, right)
+        if simpler is not None:
+            return simpler
+        if left is expr.left and right is expr.right:
+            return expr
+        return BinOp(left, expr.op, right)
+
+    def unary(self, expr: UnaryOp) -> object:
+        if expr.op == "&":
+            # the address of a const, not of its value
+            operand = expr.operand if type(expr.operand) is Var else self.expr(expr.operand)
+        else:
+            operand = self.expr(expr.operand)
+        value = constant(operand)
+        if value is not None:
+            folded = fold_unary(expr.op, value)
+            if folded is not None:
+                return Num(folded)
+        if operand is expr.operand:
+            return expr
+        return UnaryOp(expr.op, operand)
+
+    def var(self, expr: Var) -> object:
+        if expr.name in self.shadowed:
+            return expr
+        return self.constants.get(expr.name, expr)
+
+    def member_access(self, expr: MemberAccess) -> MemberAccess:
+        obj = self.expr(expr.obj)
+        return expr if obj is expr.obj else MemberAccess(obj, expr.member)
+
+    def attribute_access(self, expr: AttributeAccess) -> AttributeAccess:
+        obj = self.expr(expr.obj)
+        return expr if obj is expr.obj else AttributeAccess(obj, expr.attribute)
+
+    def index_access(self, expr: IndexAccess) -> IndexAccess:
+        obj, index = self.expr(expr.obj), self.expr(expr.index)
+        if obj is expr.obj and index is expr.index:
+            return expr
+        return IndexAccess(obj, index)
+
+    def call(self, expr: FuncCall) -> object:
+        args = [self.expr(arg) for arg in expr.args]
+        inline = self.inlines.get(expr.func_name)
+        if inline is not None and expr.func_name not in self.shadowed:
+            inlined = self.inline(inline, args)
+            if inlined is not None:
+                return inlined
+        if all(new is old for new, old in zip(args, expr.args)):
+            return expr
+        return FuncCall(expr.func_name, args)
+
+    def inline(self, inline: Inlinable, args: list) -> object | None:
+        if len(args) != len(inline.params) or self.inline_depth >= INLINE_DEPTH:
+            return None
+        if inline.free & self.shadowed:
+            return None  # the body's globals are hidden by the caller's names
+        values = {}
+        for param, arg in zip(inline.params, args):
+            # the body may not evaluate an argument, or evaluate it twice
+            if not pure(arg):
+                return None
+            if inline.uses[param.name] > 1 and size(arg) > COPY_LIMIT:
+                return None
+            values[param.name] = Cast(param.arg_type, arg)
+        self.inline_depth += 1
+        try:
+            return self.expr(Cast(inline.ret_type, substitute(inline.expr, values)))
+        finally:
+            self.inline_depth -= 1
+
+    def struct_literal(self, expr: StructLiteral) -> StructLiteral:
+        fields = [(key, self.expr(value)) for key, value in expr.fields]
+        if all(new[1] is old[1] for new, old in zip(fields, expr.fields)):
+            return expr
+        return StructLiteral(fields)
+
+    def cast(self, expr: Cast | PCast) -> object:
+        inner = self.expr(expr.expr)
+        value = constant(inner)
+        if value is not None and type(expr) is Cast:
+            folded = fold_cast(expr.type_name, value)
+            if folded is not None:
+                return Num(folded)
+        return expr if inner is expr.expr else type(expr)(expr.type_name, inner)
+
+    def conditional_expr(self, expr: Conditional) -> object:
+        condition = self.expr(expr.condition)
+        value = constant(condition)
+        if value is not None:
+            return self.expr(expr.then if value else expr.otherwise)
+        then, otherwise = self.expr(expr.then), self.expr(expr.otherwise)
+        if (
+            condition is expr.condition
+            and then is expr.then
+            and otherwise is expr.otherwise
+        ):
+            return expr
+        return Conditional(condition, then, otherwise)
+
+
+def optimize(items: list, level: int) -> tuple[list, Optimizer]:
+    """Optimize a whole program's items; the Optimizer maps module subsets."""
+    optimizer = Optimizer(level)
+    return optimizer.program(items), optimizer
+
+
+# --- tree shaking ---
+
+# top-level items that are only emitted if something reachable names them;
+# everything else (directives, includes, defines) is kept and is a root
+DEFINITIONS = (FunctionDef, StubDef, TypeDef, EnumDef, VarDecl, ConstDecl)
+
+# same nodes with "@static" added, so codegen's memo keeps hitting
+_static: dict[int, tuple[object, object]] = {}
+
+
+def references(node: object) -> set[str]:
+    """
+    Every identifier in node: names, called functions, types (inside type
+    strings such as "ptr<Vec2>") and whatever raw directives mention.
+    Over-approximating is fine, a member called like a function only keeps
+    that function alive.
+    """
+    found = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        kind = type(node)
+        if kind is str:
+            found.update(IDENTIFIER.findall(node))
+        elif kind is list or kind is tuple:
+            stack.extend(node)
+        elif kind is not Str and kind is not Char:
+            slots = getattr(kind, "__slots__", ())
+            stack.extend(getattr(node, slot) for slot in slots)
+    return found
+
+
+def defined_names(item: object) -> list[str]:
+    if type(item) is EnumDef:
+        return [item.name, *(member for member, _ in item.fields)]
+    return [item.name]
+
+
+def shake(items: list, roots: set[str] = frozenset(), static: bool = False) -> list:
+    """
+    The items reachable from main (and roots). With static=True the program
+    is a single translation unit, so its functions other than main are made
+    static as well. Without a main, items are returned as they are.
+    """
+    if not any(type(item) is FunctionDef and item.name == "main" for item in items):
+        return items
+
+    by_name: dict[str, list] = {}
+    pending = set(roots) | {"main"}
+    for item in items:
+        if isinstance(item, DEFINITIONS):
+            for name in defined_names(item):
+                by_name.setdefault(name, []).append(item)
+        else:
+            pending |= references(item)
+
+    live = set()
+    seen = set()
+    while pending:
+        name = pending.pop()
+        seen.add(name)
+        for item in by_name.get(name, ()):
+            if id(item) not in live:
+                live.add(id(item))
+                pending |= references(item) - seen
+
+    kept = [item for item in items if id(item) in live or not isinstance(item, DEFINITIONS)]
+    if not static:
+        return kept
+
+    internal = {
+        item.name
+        for item in kept
+        if type(item) is FunctionDef
+        and item.name != "main"
+        and "@extern" not in item.attributes
+    }
+    out = [make_static(item) if item_is_internal(item, internal) else item for item in kept]
+    for stale in _static.keys() - {id(item) for item in items}:
+        del _static[stale]
+    return out
+
+
+def item_is_internal(item: object, internal: set[str]) -> bool:
+    return (
+        type(item) in (FunctionDef, StubDef)
+        and item.name in internal
+        and "@static" not in item.attributes
+    )
+
+
+def make_static(item: FunctionDef | StubDef) -> FunctionDef | StubDef:
+    known = _static.get(id(item))
+    if known is not None and known[0] is item:
+        return known[1]
+    attributes = [*item.attributes, "@static"]
+    if type(item) is FunctionDef:
+        new = FunctionDef(item.name, item.ret_type, attributes, item.args, item.body)
+    else:
+        new = StubDef(item.name, item.ret_type, attributes, item.args)
+    _static[id(item)] = (item, new)
+    return new
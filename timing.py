@@ -0,0 +1,127 @@
+"""
+Per-phase timing for `neon2c --time-passes` and `--mem-profile`.
+
+The compiler wraps its phases (tokenize, parse, each import, codegen, cc)
+in phase(). While nothing has called start() that is a no-op; otherwise
+every phase is recorded with its wall time, its self time (minus nested
+phases) and, with memory=True, the most memory tracemalloc saw it use on
+top of what was allocated when it started.
+"""
+
+import contextlib
+import sys
+import time
+
+# imported by start(memory=True), which is the only way phase() uses it
+tracemalloc = None
+
+ENABLED = False
+MEMORY = False
+
+_started = 0.0
+_records: list[dict] = []
+_stack: list[dict] = []
+
+
+def start(memory: bool = False) -> None:
+    global ENABLED, MEMORY, _started, tracemalloc
+    ENABLED, MEMORY = True, memory
+    _records.clear()
+    _stack.clear()
+    if memory:
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+    _started = time.perf_counter()
+
+
+def stop() -> None:
+    global ENABLED, MEMORY
+    if MEMORY:
+        tracemalloc.stop()
+    ENABLED = MEMORY = False
+
+
+@contextlib.contextmanager
+def phase(name: str, detail: str | None = None):
+    if not ENABLED:
+        yield
+        return
+
+    record = {
+        "phase": name,
+        "detail": detail,
+        "depth": len(_stack),
+        "seconds": 0.0,
+        "self_seconds": 0.0,
+        "children": 0.0,
+    }
+    _records.append(record)
+    if MEMORY:
+        current, peak = tracemalloc.get_traced_memory()
+        if _stack:
+            # reset_peak() below forgets the parent's peak so far
+            _stack[-1]["high"] = max(_stack[-1]["high"], peak)
+        tracemalloc.reset_peak()
+        record["base"] = record["high"] = current
+    _stack.append(record)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        record["self_seconds"] = record["seconds"] - record.pop("children")
+        _stack.pop()
+        if _stack:
+            _stack[-1]["children"] += record["seconds"]
+        if MEMORY:
+            peak = max(record.pop("high"), tracemalloc.get_traced_memory()[1])
+            record["peak_bytes"] = peak - record.pop("base")
+            if _stack:
+                _stack[-1]["high"] = max(_stack[-1]["high"], peak)
+            tracemalloc.reset_peak()
+
+
+def totals() -> dict[str, float]:
+    """Self time summed per phase name."""
+    out: dict[str, float] = {}
+    for record in _records:
+        out[record["phase"]] = out.get(record["phase"], 0.0) + record["self_seconds"]
+    return out
+
+
+def report(fmt: str = "text", file=None) -> None:
+    """Print what was recorded since start(), as a table or as JSON."""
+    file = file or sys.stderr
+    total = time.perf_counter() - _started
+    if fmt == "json":
+        import json
+
+        json.dump(
+            {"total_seconds": total, "totals": totals(), "phases": _records},
+            file,
+            indent=2,
+        )
+        file.write("\n")
+        return
+
+    memory = MEMORY or any("peak_bytes" in record for record in _records)
+    header = f"{'wall ms':>10}{'self ms':>10}"
+    if memory:
+        header += f"{'peak KiB':>11}"
+    print(f"[neon] time passes:\n{header}  phase", file=file)
+    for record in _records:
+        line = f"{record['seconds'] * 1000:>10.1f}{record['self_seconds'] * 1000:>10.1f}"
+        if memory:
+            line += f"{record['peak_bytes'] / 1024:>11.1f}"
+        name = "  " * record["depth"] + record["phase"]
+        if record["detail"]:
+            name += f" {record['detail']}"
+        print(f"{line}  {name}", file=file)
+    padding = " " * (21 if memory else 10)
+    print(f"{total * 1000:>10.1f}{padding}  total", file=file)
+    summary = ", ".join(
+        f"{name} {seconds * 1000:.1f}ms" for name, seconds in totals().items()
+    )
+    print(f"[neon] self time by phase: {summary}", file=file)
@@ -1,5 +1,9 @@
+import io
+import os
+import re
+from array import array
 from dataclasses import dataclass
-@dataclass
+@dataclass(slots=True)
 class Token:
 	type   :  str
 	value  :  str
@@ -8,6 +12,8 @@ class Token:
 	file   :  str
 
 KEYWORDS = set()
+# "regex" (default) or "legacy", the original character-by-character scanner
+ENGINE = os.getenv("NEON_TOKENIZER", "regex")
 class TokenizeError(Exception):
 	def __init__(self, message: str, line: int, col: int, line_text: str):
 		pointer = " " * (col) + "^"
@@ -19,6 +25,269 @@ class TokenizeError(Exception):
 
 
 def tokenize(source: str, file: str) -> list[Token]:
+	if ENGINE == "legacy":
+		return tokenize_legacy(source, file)
+	return tokenize_regex(source, file)
+
+
+# every piece of the source matches exactly one alternative, so the pieces
+# joined back together are the source itself. prefixes that overlap follow
+# the order of the checks in tokenize_legacy: numbers and "->" before "-",
+# comments before "/", "..." before ".". the final catch-all only ever
+# matches something the legacy scanner rejects (or an unterminated "/*")
+_PIECE_RE = re.compile(
+	r"[ \t]+|\n"
+	r"|[^\W\d]\w*"
+	r"|-?0[xX][0-9a-fA-F]+|-?\d+(?:\.\d+)?"
+	r"|//[^\n]*|/\*[\s\S]*?\*/|/\*"
+	r"|\.\.\.|->"
+	r"|==|!=|>=|<=|\+=|-=|\*=|/=|&&|\|\|"
+	r'|"(?:[^"\\]|\\[\s\S])*"'
+	r"|'(?:\\[\s\S]|[^\\])[\s\S]"
+	r"|@[^ \t\n]*|#[^\n]*"
+	r"|[\s\S]"
+)
+
+# what a piece is, decided by its first character
+_WS, _NL, _ID, _NUM, _OP, _SLASH, _DOT, _DASH, _STR, _CHAR, _ATTR, _PP = range(12)
+_DISPATCH = {" ": _WS, "\t": _WS, "\n": _NL, "_": _ID, "/": _SLASH, ".": _DOT, "-": _DASH,
+	'"': _STR, "'": _CHAR, "@": _ATTR, "#": _PP}
+_DISPATCH.update(dict.fromkeys("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ", _ID))
+_DISPATCH.update(dict.fromkeys("0123456789", _NUM))
+_DISPATCH.update(dict.fromkeys("=!<>+*&%|(),{}:;[]", _OP))
+
+
+_PIECE_RE_BYTES = re.compile(_PIECE_RE.pattern.encode())
+_DISPATCH_BYTES = {ord(char): kind for char, kind in _DISPATCH.items()}
+
+
+class _Unsupported(Exception):
+	"""Input the regex engine leaves to tokenize_legacy."""
+
+
+def _scan(source):
+	"""
+	Yield (type, value_start, value_end, line, column) for every token.
+	source is a str or, for pure-ASCII input, a bytes-like buffer. Raises
+	_Unsupported for anything unusual (errors, odd unicode digits) so the
+	caller can hand it to the legacy scanner, which keeps the diagnostics
+	exactly the same.
+	"""
+	text = isinstance(source, str)
+	if text:
+		pieces = _PIECE_RE.findall(source)
+		dispatch = _DISPATCH.get
+		keywords = KEYWORDS
+		newline, arrow, minus_eq, ellipsis, star, slash = "\n", "->", "-=", "...", "*", "/"
+	else:
+		pieces = _PIECE_RE_BYTES.findall(source)
+		dispatch = _DISPATCH_BYTES.get
+		keywords = {keyword.encode() for keyword in KEYWORDS}
+		newline, arrow, minus_eq, ellipsis, star, slash = b"\n", b"->", b"-=", b"...", b"*", b"/"
+	end = len(source)
+	line = 1
+	# column = index - col_base. the legacy scanner doesn't advance the
+	# column over "->", so every arrow shifts the rest of the line left
+	col_base = -1
+	pos = 0
+	for piece in pieces:
+		start = pos
+		pos += len(piece)
+		kind = dispatch(piece[0])
+		if kind == _WS:
+			continue
+		if kind == _ID:
+			if piece in keywords:
+				yield (piece if text else piece.decode()), start, pos, line, start - col_base
+			else:
+				yield "ID", start, pos, line, start - col_base
+		elif kind == _OP:
+			yield "OP", start, pos, line, start - col_base
+		elif kind == _NL:
+			line += 1
+			col_base = start
+		elif kind == _NUM:
+			yield "NUMBER", start, pos, line, start - col_base
+		elif kind == _STR:
+			if len(piece) == 1:  # unterminated
+				raise _Unsupported
+			yield "STRING", start + 1, pos - 1, line, start - col_base
+		elif kind == _DASH:
+			if piece == arrow:
+				yield "arrow", start, pos, line, start - col_base
+				col_base += 2
+			elif len(piece) > 1 and piece != minus_eq:
+				yield "NUMBER", start, pos, line, start - col_base
+			elif pos == end:
+				# the legacy scanner trips over a trailing "-"
+				raise _Unsupported
+			else:
+				yield "OP", start, pos, line, start - col_base
+		elif kind == _SLASH:
+			second = piece[1:2]
+			if second == star:
+				if len(piece) == 2:  # unterminated
+					raise _Unsupported
+				last_newline = piece.rfind(newline)
+				if last_newline != -1:
+					line += piece.count(newline)
+					col_base = start + last_newline
+			elif second != slash:
+				yield "OP", start, pos, line, start - col_base
+		elif kind == _DOT:
+			yield ("ELLIPSIS" if piece == ellipsis else "OP"), start, pos, line, start - col_base
+		elif kind == _ATTR:
+			yield "ATTR", start, pos, line, start - col_base
+		elif kind == _PP:
+			# the legacy scanner reports the column where the directive ends
+			yield "PP_DIRECTIVE", start, pos, line, pos - col_base
+		elif kind == _CHAR:
+			if len(piece) == 1:  # unterminated
+				raise _Unsupported
+			yield "CHAR", start, pos, line, start - col_base
+		elif text and piece[0].isalpha():
+			yield (piece if piece in keywords else "ID"), start, pos, line, start - col_base
+		elif text and piece[0].isdecimal() and not piece.isalnum():
+			yield "NUMBER", start, pos, line, start - col_base
+		else:
+			raise _Unsupported
+
+
+def tokenize_regex(source: str, file: str) -> list[Token]:
+	"""
+	Same token stream as tokenize_legacy, built from one regex pass and a
+	first-character dispatch table.
+	"""
+	try:
+		return [
+			Token(kind, source[start:end], line, column, file)
+			for kind, start, end, line, column in _scan(source)
+		]
+	except _Unsupported:
+		pass
+	return tokenize_legacy(source, file)
+
+
+# files that can't be scanned in place: the text-mode read that the rest of
+# the compiler does would decode them or translate their newlines
+_NEEDS_TEXT_READ = re.compile(rb"[\x80-\xff\r]")
+
+
+class TokenStore:
+	"""
+	Columnar token storage. Kind, value span, line and column of every token
+	live in parallel arrays and values are sliced out of the source buffer
+	on demand, so a token costs a few bytes instead of a Token object and
+	its own string. Indexing builds a Token for just that position, which
+	is all Parser.current()/lookahead() ask for.
+	"""
+
+	def __init__(self, buffer, file: str) -> None:
+		# a str, or the pure-ASCII bytes of a file
+		self.buffer = buffer
+		self.file = file
+		self.kind_names: list[str] = []
+		self.kinds = array("H")
+		self.starts = array("I")
+		self.ends = array("I")
+		self.lines = array("I")
+		self.columns = array("I")
+		# only used by stores built from a token list, see from_tokens
+		self.values: list[str] | None = None
+
+	@classmethod
+	def from_source(cls, source: str, file: str) -> "TokenStore":
+		if ENGINE == "legacy":
+			return cls.from_tokens(tokenize_legacy(source, file), file, source)
+		store = cls(source, file)
+		try:
+			store._fill(_scan(source))
+			return store
+		except _Unsupported:
+			pass
+		return cls.from_tokens(tokenize_legacy(source, file), file, source)
+
+	@classmethod
+	def from_file(cls, path: str) -> "TokenStore":
+		"""
+		Read path once and tokenize the bytes in place when they are plain
+		ASCII, otherwise decode them the way a text-mode open() would. A
+		copy rather than a mapping: values are sliced out long after the
+		scan, and an editor saving the file meanwhile mustn't change them.
+		"""
+		with open(path, "rb") as f:
+			data = f.read()
+		if ENGINE != "legacy" and not _NEEDS_TEXT_READ.search(data):
+			store = cls(data, path)
+			try:
+				store._fill(_scan(data))
+				return store
+			except _Unsupported:
+				pass
+		return cls.from_source(io.TextIOWrapper(io.BytesIO(data)).read(), path)
+
+	@classmethod
+	def from_tokens(cls, tokens: list[Token], file: str, source: str = "") -> "TokenStore":
+		store = cls(source, file)
+		store._fill((t.type, 0, 0, t.line, t.column) for t in tokens)
+		store.values = [t.value for t in tokens]
+		return store
+
+	def _fill(self, scanned) -> None:
+		kind_ids = {}
+		kind_names = self.kind_names
+		kinds, starts, ends = self.kinds.append, self.starts.append, self.ends.append
+		lines, columns = self.lines.append, self.columns.append
+		for kind, start, end, line, column in scanned:
+			kind_id = kind_ids.get(kind)
+			if kind_id is None:
+				kind_id = kind_ids[kind] = len(kind_names)
+				kind_names.append(kind)
+			kinds(kind_id)
+			starts(start)
+			ends(end)
+			lines(line)
+			columns(column)
+
+	def __len__(self) -> int:
+		return len(self.kinds)
+
+	def __getitem__(self, index: int) -> Token:
+		if self.values is not None:
+			value = self.values[index]
+		else:
+			value = self.buffer[self.starts[index]:self.ends[index]]
+			if not isinstance(value, str):
+				value = value.decode("ascii")
+		return Token(
+			self.kind_names[self.kinds[index]],
+			value,
+			self.lines[index],
+			self.columns[index],
+			self.file,
+		)
+
+	def __iter__(self):
+		for index in range(len(self.kinds)):
+			yield self[index]
+
+	def type(self, index: int) -> str:
+		return self.kind_names[self.kinds[index]]
+
+	def value(self, index: int) -> str:
+		if self.values is not None:
+			return self.values[index]
+		value = self.buffer[self.starts[index]:self.ends[index]]
+		return value if isinstance(value, str) else value.decode("ascii")
+
+	def text(self) -> str:
+		"""The whole source, for error messages."""
+		if isinstance(self.buffer, str):
+			return self.buffer
+		return self.buffer.decode("ascii")
+
+
+def tokenize_legacy(source: str, file: str) -> list[Token]:
 	tokens = []
 	line = 0
 	column = 0